@@ -0,0 +1,350 @@
+import time
+
+INICIO = time.perf_counter()
+
+import os
+import json
+import argparse
+import threading
+import tkinter as tk
+from tkinter import ttk, simpledialog, messagebox
+
+# Só a interface é importada aqui; cv2, numpy, face_recognition (dlib e os
+# modelos) e a galeria são carregados em segundo plano pelos Recursos
+PASTA_ROSTOS = "rostos_cadastrados"
+
+
+def _desde_inicio():
+    return time.perf_counter() - INICIO
+
+
+class Recursos:
+    """Bibliotecas, modelos do dlib, banco e galeria carregados uma vez por processo.
+
+    `aquecer` roda as etapas em ordem numa thread em segundo plano, enquanto a
+    janela já está na tela; `etapa` e `concluidas` alimentam a barra de
+    progresso. Depois de prontos, detector, encoder e índice são reutilizados
+    por todas as sessões de cadastro e reconhecimento.
+    """
+
+    def __init__(self):
+        self.etapas = [("Carregando OpenCV e NumPy", self._bibliotecas),
+                       ("Carregando os modelos do dlib", self._modelos),
+                       ("Preparando detector e encoder", self._primeira_inferencia),
+                       ("Atualizando o banco de rostos", self._banco),
+                       ("Carregando a galeria", self._galeria)]
+        self.etapa = ""
+        self.concluidas = 0
+        self.tempos = {}
+        self.marcos = {}
+        self.sessoes = []
+        self.erro = None
+        self.pronto = threading.Event()
+        self._lock = threading.Lock()
+        self.cv2 = self.fr = self.escritor = self.indice = None
+        self.nomes_por_id = {}
+
+    def _bibliotecas(self):
+        import cv2
+        import numpy
+
+        self.cv2 = cv2
+
+    def _modelos(self):
+        # O import do face_recognition carrega o dlib e os quatro modelos
+        import face_recognition
+
+        self.fr = face_recognition
+
+    def _primeira_inferencia(self):
+        # A primeira chamada aloca as pirâmides de imagem e os buffers da rede;
+        # pagar isso aqui tira o atraso do primeiro frame da primeira sessão
+        import numpy as np
+
+        imagem = np.zeros((150, 150, 3), dtype=np.uint8)
+        self.fr.face_locations(imagem)
+        self.fr.face_landmarks(imagem, [(0, 150, 150, 0)], model="small")
+        self.fr.face_encodings(imagem, [(0, 150, 150, 0)])
+
+    def _banco(self):
+        from banco import inicializar_banco, atualizar_encodings, EscritorReconhecimentos
+
+        os.makedirs(PASTA_ROSTOS, exist_ok=True)
+        inicializar_banco()
+        atualizar_encodings()
+        self.escritor = EscritorReconhecimentos()
+
+    def _galeria(self):
+        from banco import carregar_galeria
+        from indice import abrir_indice
+
+        ids, nomes, matriz = carregar_galeria()
+        self.indice = abrir_indice(ids, matriz)
+        self.nomes_por_id = dict(zip(ids, nomes))
+
+    def aquecer(self):
+        try:
+            for descricao, etapa in self.etapas:
+                self.etapa = descricao
+                inicio = time.perf_counter()
+                etapa()
+                self.tempos[descricao] = time.perf_counter() - inicio
+                self.concluidas += 1
+            self.marcos["pronto"] = _desde_inicio()
+        except Exception as erro:
+            self.erro = erro
+        finally:
+            self.pronto.set()
+
+    def iniciar(self):
+        threading.Thread(target=self.aquecer, daemon=True).start()
+
+    def adicionar(self, id_usuario, nome, encoding):
+        """Inclui um cadastro novo na galeria residente, sem recarregar o banco."""
+        with self._lock:
+            self.indice.adicionar(id_usuario, encoding)
+            self.nomes_por_id[id_usuario] = nome
+
+    def nova_estrategia(self, qualidade=True):
+        # Só o estado das trilhas é por sessão; índice e modelos são os mesmos
+        from deteccao import EstrategiaDeteccao
+        from qualidade import AvaliadorQualidade
+
+        return EstrategiaDeteccao(self.indice, self.nomes_por_id,
+                                  qualidade=AvaliadorQualidade() if qualidade else None)
+
+    def registrar_sessao(self, tipo, preparo):
+        self.sessoes.append({"tipo": tipo, "preparo_segundos": preparo})
+
+    def relatorio(self):
+        return {"marcos_segundos": dict(self.marcos), "etapas_segundos": dict(self.tempos),
+                "galeria": len(self.nomes_por_id), "sessoes": list(self.sessoes)}
+
+    def fechar(self):
+        if self.escritor:
+            self.escritor.fechar()
+
+
+class Aplicacao:
+    """Janela principal: aparece na hora e libera os botões quando os recursos ficam prontos."""
+
+    def __init__(self, root, recursos, opcoes):
+        self.root = root
+        self.recursos = recursos
+        self.opcoes = opcoes
+        self._em_sessao = threading.Lock()
+
+        root.title("Sistema de Reconhecimento Facial")
+        root.geometry("300x240")
+        self.status = tk.Label(root, text="Iniciando...")
+        self.status.pack(pady=(10, 2))
+        self.barra = ttk.Progressbar(root, maximum=len(recursos.etapas), length=250)
+        self.barra.pack(pady=(0, 6))
+        self.botoes = [tk.Button(root, text="Cadastrar Rosto", command=self.cadastrar, width=25, state=tk.DISABLED),
+                       tk.Button(root, text="Reconhecer Rosto", command=self.reconhecer, width=25,
+                                 state=tk.DISABLED)]
+        for botao in self.botoes:
+            botao.pack(pady=6)
+        tk.Button(root, text="Sair", command=root.quit, width=25).pack(pady=6)
+
+    def acompanhar(self):
+        """Atualiza a barra de progresso até o aquecimento terminar."""
+        recursos = self.recursos
+        self.barra["value"] = recursos.concluidas
+        if not recursos.pronto.is_set():
+            self.status["text"] = f"{recursos.etapa}..."
+            self.root.after(50, self.acompanhar)
+        elif recursos.erro:
+            self.status["text"] = "Falha ao carregar"
+            messagebox.showerror("Erro", f"Não foi possível carregar os modelos: {recursos.erro}")
+        else:
+            self.status["text"] = f"Pronto em {recursos.marcos['pronto']:.1f}s ({len(recursos.nomes_por_id)} rostos)"
+            for botao in self.botoes:
+                botao["state"] = tk.NORMAL
+
+    def _sessao(self, alvo, *args):
+        # Uma sessão de câmera por vez: as duas disputariam o dispositivo
+        def executar():
+            if not self._em_sessao.acquire(blocking=False):
+                messagebox.showwarning("Aviso", "Já existe uma sessão com a câmera aberta.")
+                return
+            try:
+                alvo(*args)
+            finally:
+                self._em_sessao.release()
+
+        threading.Thread(target=executar, daemon=True).start()
+
+    def cadastrar(self):
+        nome = simpledialog.askstring("Cadastro", "Digite o nome da pessoa:")
+        if nome:
+            self._sessao(self._cadastro, nome)
+
+    def reconhecer(self):
+        self._sessao(self._reconhecimento)
+
+    def _cadastro(self, nome):
+        from qualidade import AvaliadorQualidade
+        from cadastro import coletar_amostras, salvar_amostras
+
+        recursos, cv2 = self.recursos, self.recursos.cv2
+        inicio = time.perf_counter()
+        video_capture = cv2.VideoCapture(0)
+        if not video_capture.isOpened():
+            messagebox.showerror("Erro", "Não foi possível acessar a câmera.")
+            return
+        recursos.registrar_sessao("cadastro", time.perf_counter() - inicio)
+
+        messagebox.showinfo("Instrução", "Posicione o rosto na câmera. Pressione 'c' e mexa levemente a "
+                                         "cabeça por alguns segundos.")
+        while True:
+            ret, frame = video_capture.read()
+            if not ret:
+                messagebox.showerror("Erro", "Falha ao capturar imagem.")
+                break
+
+            cv2.imshow('Cadastro de Rosto', frame)
+            if cv2.waitKey(1) & 0xFF == ord('c'):
+                avaliador = AvaliadorQualidade()
+                amostras = coletar_amostras(video_capture, avaliador, k=self.opcoes.amostras,
+                                            janela='Cadastro de Rosto')
+                if amostras:
+                    for id_usuario, encoding in salvar_amostras(nome, amostras, PASTA_ROSTOS,
+                                                                self.opcoes.centroide):
+                        recursos.adicionar(id_usuario, nome, encoding)
+                    messagebox.showinfo("Sucesso", f"Rosto de {nome} cadastrado com sucesso "
+                                                   f"({len(amostras)} amostras)!")
+                else:
+                    messagebox.showwarning("Aviso", "Nenhuma imagem boa o suficiente. "
+                                                    f"{avaliador.relatorio()}. Tente novamente.")
+                break
+
+        video_capture.release()
+        cv2.destroyAllWindows()
+
+    def _reconhecimento(self):
+        from pipeline import PipelineReconhecimento, registrador
+        from metricas import TemposEtapas
+
+        recursos, opcoes = self.recursos, self.opcoes
+        if not recursos.nomes_por_id:
+            messagebox.showinfo("Aviso", "Nenhum rosto cadastrado foi encontrado.")
+            return
+
+        inicio = time.perf_counter()
+        estrategia = recursos.nova_estrategia(opcoes.qualidade)
+        video_capture = recursos.cv2.VideoCapture(0)
+        if not video_capture.isOpened():
+            messagebox.showerror("Erro", "Não foi possível acessar a câmera.")
+            return
+
+        # Preparo = do clique até o primeiro frame reconhecido
+        registrar = registrador(recursos.escritor, "camera 0")
+        primeiro = []
+
+        def ao_resultado(resultado):
+            if not primeiro:
+                primeiro.append(time.perf_counter() - inicio)
+                recursos.registrar_sessao("reconhecimento", primeiro[0])
+            registrar(resultado)
+
+        tempos = TemposEtapas(ativo=opcoes.metricas)
+        tempos.definir("galeria_tamanho", len(recursos.nomes_por_id))
+        pipeline = PipelineReconhecimento(video_capture, estrategia.processar, trabalhadores=1,
+                                          ao_resultado=ao_resultado, tempos=tempos,
+                                          sobreposicao=opcoes.sobreposicao)
+        pipeline.executar(janela='Reconhecimento Facial (q para sair)')
+        if opcoes.metricas:
+            print(pipeline.relatorio())
+            print(estrategia.relatorio())
+
+
+def imprimir_relatorio(relatorio):
+    for marco, segundos in relatorio["marcos_segundos"].items():
+        print(f"{marco:<28} {segundos:>8.3f} s desde o início")
+    for etapa, segundos in relatorio["etapas_segundos"].items():
+        print(f"  {etapa:<30} {segundos:>8.3f} s")
+    for numero, sessao in enumerate(relatorio["sessoes"], 1):
+        print(f"sessão {numero} ({sessao['tipo']}): preparo {sessao['preparo_segundos'] * 1000:.0f} ms")
+    for chave in ("sessao_fria_ms", "sessao_quente_ms"):
+        if chave in relatorio:
+            print(f"{chave:<28} {relatorio[chave]:>8.1f} ms")
+
+
+def medir_partida(recursos, rodadas=3):
+    """Sem interface: aquecimento a frio e preparo de sessão recarregando tudo versus residente.
+
+    A sessão fria repete o que o reco-teste.py faz a cada clique (atualizar o
+    banco, carregar a galeria, abrir o índice); a quente usa os Recursos. As
+    duas incluem o primeiro frame processado.
+    """
+    # Aquece antes de qualquer import: as etapas medem o carregamento das bibliotecas a frio
+    recursos.aquecer()
+    if recursos.erro:
+        raise recursos.erro
+
+    import numpy as np
+    from banco import atualizar_encodings, carregar_galeria
+    from indice import abrir_indice
+    from deteccao import EstrategiaDeteccao
+    from metricas import TemposEtapas
+
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    tempos = TemposEtapas(ativo=False)
+
+    def fria():
+        atualizar_encodings()
+        ids, nomes, matriz = carregar_galeria()
+        EstrategiaDeteccao(abrir_indice(ids, matriz), dict(zip(ids, nomes))).processar(frame, tempos)
+
+    def quente():
+        recursos.nova_estrategia().processar(frame, tempos)
+
+    relatorio = recursos.relatorio()
+    for nome, sessao in (("sessao_fria_ms", fria), ("sessao_quente_ms", quente)):
+        duracoes = []
+        for _ in range(rodadas):
+            inicio = time.perf_counter()
+            sessao()
+            duracoes.append(time.perf_counter() - inicio)
+        relatorio[nome] = 1000 * float(np.median(duracoes))
+    return relatorio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sistema de Reconhecimento Facial (partida rápida)")
+    parser.add_argument("--sem-metricas", dest="metricas", action="store_false",
+                        help="desliga os contadores por etapa")
+    parser.add_argument("--sobreposicao", action="store_true", help="mostra as métricas sobre o vídeo")
+    parser.add_argument("--sem-qualidade", dest="qualidade", action="store_false",
+                        help="codifica todos os rostos, sem descartar os pequenos, borrados ou de perfil")
+    parser.add_argument("--amostras", type=int, default=5, help="melhores frames guardados por cadastro")
+    parser.add_argument("--centroide", action="store_true",
+                        help="grava a média das amostras em vez de um encoding por amostra")
+    parser.add_argument("--medir-partida", action="store_true",
+                        help="sem interface: mede o aquecimento e o preparo de sessão frio e quente")
+    parser.add_argument("--relatorio", default=None, help="grava o relatório de partida em JSON")
+    opcoes = parser.parse_args()
+
+    recursos = Recursos()
+    if opcoes.medir_partida:
+        relatorio = medir_partida(recursos)
+    else:
+        root = tk.Tk()
+        aplicacao = Aplicacao(root, recursos, opcoes)
+        root.update()
+        recursos.marcos["janela_visivel"] = _desde_inicio()
+        recursos.iniciar()
+        aplicacao.acompanhar()
+        root.mainloop()
+        relatorio = recursos.relatorio()
+    recursos.fechar()
+
+    imprimir_relatorio(relatorio)
+    if opcoes.relatorio:
+        with open(opcoes.relatorio, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
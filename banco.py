@@ -0,0 +1,438 @@
+import os
+import time
+import queue
+import hashlib
+import logging
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# Constantes
+DB_PATH = "rostos.db"
+DIMENSAO_ENCODING = 128
+# Identifica o modelo/parâmetros que geraram o encoding salvo. Se mudar,
+# os encodings antigos deixam de ser usados e são recalculados no backfill.
+MODELO_ENCODING = "dlib_resnet_v1/jitters=1/landmarks=small"
+
+COLUNAS_ENCODING = {
+    "encoding": "BLOB",
+    "modelo": "TEXT",
+    "imagem_mtime": "REAL",
+    "imagem_hash": "TEXT",
+    # NULL: encoding da própria imagem; ORIGEM_CENTROIDE: média de várias amostras
+    "origem": "TEXT",
+}
+ORIGEM_CENTROIDE = "centroide"
+
+
+SQL_INSERIR_RECONHECIMENTO = '''
+    INSERT INTO reconhecimentos (usuario_id, instante, distancia, fonte)
+    VALUES (?, ?, ?, ?)
+'''
+
+# Uma conexão por thread, reaproveitada entre chamadas
+_local = threading.local()
+
+
+def conexao():
+    """Conexão da thread atual com o banco, criada na primeira chamada.
+
+    Usa WAL, para leituras não bloquearem a escrita, e um cache grande de
+    comandos preparados: como o SQL de cada função é constante, o sqlite3
+    reaproveita o comando compilado a cada chamada.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.caminho != DB_PATH:
+        conn = sqlite3.connect(DB_PATH, timeout=30, cached_statements=256)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        _local.conn, _local.caminho = conn, DB_PATH
+    return conn
+
+
+def fechar_conexao():
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+def inicializar_banco():
+    conn = conexao()
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            imagem_path TEXT NOT NULL,
+            data_cadastro TEXT NOT NULL
+        )
+    ''')
+
+    # Migração: bancos antigos não têm as colunas do encoding
+    existentes = {linha[1] for linha in cursor.execute('PRAGMA table_info(usuarios)')}
+    for coluna, tipo in COLUNAS_ENCODING.items():
+        if coluna not in existentes:
+            cursor.execute(f'ALTER TABLE usuarios ADD COLUMN {coluna} {tipo}')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_usuarios_hash ON usuarios (imagem_hash)')
+
+    # Registro append-only de cada rosto reconhecido
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reconhecimentos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            usuario_id INTEGER NOT NULL REFERENCES usuarios (id),
+            instante REAL NOT NULL,
+            distancia REAL NOT NULL,
+            fonte TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_reconhecimentos_instante ON reconhecimentos (instante)')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_reconhecimentos_usuario
+        ON reconhecimentos (usuario_id, instante)
+    ''')
+
+    conn.commit()
+
+
+def hash_arquivo(caminho):
+    h = hashlib.sha1()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 16), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def encoding_para_blob(encoding):
+    return np.asarray(encoding, dtype=np.float32).tobytes()
+
+
+def blob_para_encoding(blob):
+    return np.frombuffer(blob, dtype=np.float32)
+
+
+def calcular_encoding(caminho):
+    import face_recognition
+
+    imagem = face_recognition.load_image_file(caminho)
+    encodings = face_recognition.face_encodings(imagem)
+    if not encodings:
+        return None
+    return encodings[0]
+
+
+SQL_INSERIR_USUARIO = '''
+    INSERT INTO usuarios (nome, imagem_path, data_cadastro,
+                          encoding, modelo, imagem_mtime, imagem_hash, origem)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def _linha_usuario(nome, caminho_imagem, encoding, mtime=None, hash_img=None, origem=None):
+    data_cadastro = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    blob = modelo = None
+    if encoding is not None:
+        blob = encoding_para_blob(encoding)
+        modelo = MODELO_ENCODING
+    if hash_img is None and os.path.exists(caminho_imagem):
+        mtime = os.path.getmtime(caminho_imagem)
+        hash_img = hash_arquivo(caminho_imagem)
+    return (nome, caminho_imagem, data_cadastro, blob, modelo, mtime, hash_img, origem)
+
+
+def salvar_usuario_no_banco(nome, caminho_imagem, encoding=None, origem=None):
+    conn = conexao()
+    cursor = conn.cursor()
+    cursor.execute(SQL_INSERIR_USUARIO, _linha_usuario(nome, caminho_imagem, encoding, origem=origem))
+    id_usuario = cursor.lastrowid
+    conn.commit()
+    return id_usuario
+
+
+def salvar_usuarios_no_banco(registros, tamanho_lote=1000):
+    """Insere vários usuários numa única transação.
+
+    `registros` é um iterável de (nome, caminho_imagem, encoding, mtime, hash),
+    inserido em lotes de `tamanho_lote` com executemany. O lock de escrita fica
+    preso enquanto ele é consumido: passe os registros já prontos, não um
+    gerador que ainda calcula encodings. Retorna o número de linhas inseridas.
+    """
+    conn = conexao()
+    cursor = conn.cursor()
+    total = 0
+    lote = []
+    try:
+        for registro in registros:
+            lote.append(_linha_usuario(*registro))
+            if len(lote) == tamanho_lote:
+                cursor.executemany(SQL_INSERIR_USUARIO, lote)
+                total += len(lote)
+                lote = []
+        if lote:
+            cursor.executemany(SQL_INSERIR_USUARIO, lote)
+            total += len(lote)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return total
+
+
+def hashes_cadastrados():
+    conn = conexao()
+    cursor = conn.cursor()
+    cursor.execute('SELECT imagem_hash FROM usuarios WHERE imagem_hash IS NOT NULL')
+    hashes = {linha[0] for linha in cursor.fetchall()}
+    return hashes
+
+
+def carregar_usuarios_do_banco():
+    conn = conexao()
+    cursor = conn.cursor()
+    cursor.execute('SELECT nome, imagem_path FROM usuarios')
+    dados = cursor.fetchall()
+    return dados
+
+
+def atualizar_encodings(forcar=False):
+    """Calcula os encodings que faltam ou que ficaram desatualizados.
+
+    Uma linha é recalculada quando não tem encoding, quando foi gerada por
+    outro modelo ou quando a imagem mudou (mtime diferente e hash diferente).
+    Se só o mtime mudou, apenas o mtime é atualizado. Retorna um dicionário
+    com a contagem de linhas atualizadas, sem rosto e com arquivo ausente.
+
+    Linhas de centróide não vêm de uma imagem só e ficam como estão, mesmo
+    com `forcar`. Só quando o modelo muda (e a média antiga deixa de valer)
+    são recalculadas a partir da imagem guardada, virando linhas comuns.
+    """
+    conn = conexao()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, imagem_path, modelo, imagem_mtime, imagem_hash, origem FROM usuarios
+    ''')
+    linhas = cursor.fetchall()
+
+    resumo = {"atualizados": 0, "sem_rosto": 0, "ausentes": 0}
+    for id_usuario, caminho, modelo, mtime, hash_img, origem in linhas:
+        if origem == ORIGEM_CENTROIDE and modelo == MODELO_ENCODING:
+            continue
+        if not os.path.exists(caminho):
+            resumo["ausentes"] += 1
+            continue
+
+        mtime_atual = os.path.getmtime(caminho)
+        # Linha já processada pelo modelo atual (com ou sem rosto encontrado)
+        valido = modelo == MODELO_ENCODING
+        if valido and mtime == mtime_atual and not forcar:
+            continue
+
+        hash_atual = hash_arquivo(caminho)
+        if valido and hash_img == hash_atual and not forcar:
+            cursor.execute('UPDATE usuarios SET imagem_mtime = ? WHERE id = ?',
+                           (mtime_atual, id_usuario))
+            continue
+
+        # Não segura a escrita no banco enquanto o dlib calcula
+        conn.commit()
+        encoding = calcular_encoding(caminho)
+        if encoding is None:
+            # Invalida o encoding antigo: a imagem atual não tem rosto
+            cursor.execute('''
+                UPDATE usuarios SET encoding = NULL, modelo = ?,
+                                    imagem_mtime = ?, imagem_hash = ?, origem = NULL
+                WHERE id = ?
+            ''', (MODELO_ENCODING, mtime_atual, hash_atual, id_usuario))
+            resumo["sem_rosto"] += 1
+        else:
+            cursor.execute('''
+                UPDATE usuarios SET encoding = ?, modelo = ?,
+                                    imagem_mtime = ?, imagem_hash = ?, origem = NULL
+                WHERE id = ?
+            ''', (encoding_para_blob(encoding), MODELO_ENCODING,
+                  mtime_atual, hash_atual, id_usuario))
+            resumo["atualizados"] += 1
+
+    conn.commit()
+    return resumo
+
+
+def carregar_galeria():
+    """Carrega todos os encodings válidos com uma única consulta.
+
+    Retorna (ids, nomes, matriz) onde matriz é um array float32 contíguo
+    de formato (N, 128).
+    """
+    conn = conexao()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT id, nome, encoding FROM usuarios
+        WHERE encoding IS NOT NULL AND modelo = ?
+        ORDER BY id
+    ''', (MODELO_ENCODING,))
+    dados = cursor.fetchall()
+
+    ids = [linha[0] for linha in dados]
+    nomes = [linha[1] for linha in dados]
+    matriz = np.frombuffer(b"".join(linha[2] for linha in dados), dtype=np.float32)
+    matriz = matriz.reshape(-1, DIMENSAO_ENCODING).copy()
+    return ids, nomes, matriz
+
+
+class EscritorReconhecimentos:
+    """Grava os reconhecimentos em lote, numa thread própria.
+
+    `registrar` só coloca o evento numa fila e nunca bloqueia o laço de
+    reconhecimento. A thread grava com um executemany a cada `max_eventos`
+    eventos ou a cada `intervalo_ms`, o que vier primeiro.
+
+    Se o banco estiver ocupado (ex.: "database is locked"), o lote é mantido
+    e gravado de novo com espera crescente até `ESPERA_MAXIMA`. Enquanto isso
+    a fila segura até `max_fila` eventos; o que passar disso é descartado e
+    contado em `descartados`, em vez de crescer a memória sem limite.
+    """
+
+    _FIM = object()
+    ESPERA_MAXIMA = 5.0
+    # Tentativas no fechamento, para `fechar` não travar com o banco bloqueado
+    TENTATIVAS_FECHAR = 3
+
+    def __init__(self, max_eventos=500, intervalo_ms=250, max_fila=20000):
+        self.max_eventos = max_eventos
+        self.intervalo = intervalo_ms / 1000.0
+        self.gravados = 0
+        self.lotes = 0
+        self.falhas = 0
+        self.descartados = 0
+        self._trava_descartados = threading.Lock()
+        self._fila = queue.Queue(maxsize=max_fila)
+        self._fechando = threading.Event()
+        self._thread = threading.Thread(target=self._executar, daemon=True)
+        self._thread.start()
+
+    def registrar(self, usuario_id, distancia, fonte=None, instante=None):
+        try:
+            self._fila.put_nowait((usuario_id, instante if instante is not None else time.time(),
+                                   float(distancia), fonte))
+        except queue.Full:
+            self._descartar(1)
+
+    def _descartar(self, n):
+        with self._trava_descartados:
+            self.descartados += n
+
+    def _gravar(self, conn, lote):
+        """True se gravou; em erro do SQLite o lote fica com quem chamou."""
+        try:
+            with conn:
+                conn.executemany(SQL_INSERIR_RECONHECIMENTO, lote)
+        except sqlite3.Error as erro:
+            self.falhas += 1
+            log.warning("Falha ao gravar %d reconhecimentos: %s", len(lote), erro)
+            return False
+        self.gravados += len(lote)
+        self.lotes += 1
+        return True
+
+    def _executar(self):
+        conn = conexao()
+        lote = []
+        espera = self.intervalo
+        prazo = time.monotonic() + espera
+        while not self._fechando.is_set():
+            if len(lote) < self.max_eventos:
+                try:
+                    evento = self._fila.get(timeout=max(prazo - time.monotonic(), 0))
+                except queue.Empty:
+                    evento = None
+                if evento is self._FIM:
+                    break
+                if evento is not None:
+                    lote.append(evento)
+            else:
+                # Lote cheio aguardando nova tentativa: os eventos novos esperam na fila
+                self._fechando.wait(max(prazo - time.monotonic(), 0))
+            falhando = espera > self.intervalo
+            if time.monotonic() >= prazo or (len(lote) >= self.max_eventos and not falhando):
+                if not lote or self._gravar(conn, lote):
+                    lote = []
+                    espera = self.intervalo
+                else:
+                    espera = min(max(espera, 0.05) * 2, self.ESPERA_MAXIMA)
+                prazo = time.monotonic() + espera
+        self._drenar(conn, lote)
+        fechar_conexao()
+
+    def _drenar(self, conn, lote):
+        while True:
+            try:
+                evento = self._fila.get_nowait()
+            except queue.Empty:
+                break
+            if evento is not self._FIM:
+                lote.append(evento)
+        for inicio in range(0, len(lote), self.max_eventos):
+            parte = lote[inicio:inicio + self.max_eventos]
+            for tentativa in range(self.TENTATIVAS_FECHAR):
+                if self._gravar(conn, parte):
+                    break
+                time.sleep(min(0.1 * 2 ** tentativa, self.ESPERA_MAXIMA))
+            else:
+                # Banco ainda indisponível: desiste do restante de uma vez
+                self._descartar(len(lote) - inicio)
+                break
+
+    def fechar(self):
+        """Grava o que estiver pendente e encerra a thread."""
+        self._fechando.set()
+        try:
+            self._fila.put_nowait(self._FIM)
+        except queue.Full:
+            pass
+        self._thread.join()
+        if self.descartados:
+            log.warning("%d reconhecimentos descartados (fila cheia ou banco indisponível)", self.descartados)
+
+
+def compactar_reconhecimentos(reter_dias=90, vacuum=False):
+    """Apaga reconhecimentos mais antigos que `reter_dias` e devolve o espaço do WAL.
+
+    Retorna o número de linhas apagadas.
+    """
+    conn = conexao()
+    limite = time.time() - reter_dias * 86400
+    with conn:
+        apagados = conn.execute('DELETE FROM reconhecimentos WHERE instante < ?', (limite,)).rowcount
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    if vacuum:
+        conn.execute('VACUUM')
+    return apagados
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Manutenção do banco de rostos.")
+    parser.add_argument("--backfill", action="store_true",
+                        help="calcula e salva os encodings que faltam ou estão desatualizados")
+    parser.add_argument("--forcar", action="store_true",
+                        help="recalcula todos os encodings, mesmo os válidos")
+    parser.add_argument("--compactar", action="store_true",
+                        help="apaga reconhecimentos antigos e compacta o banco")
+    parser.add_argument("--reter-dias", type=float, default=90,
+                        help="dias de reconhecimentos mantidos por --compactar")
+    parser.add_argument("--vacuum", action="store_true", help="roda VACUUM depois de --compactar")
+    args = parser.parse_args()
+
+    inicializar_banco()
+    if args.backfill or args.forcar:
+        resumo = atualizar_encodings(forcar=args.forcar)
+        print(f"Encodings atualizados: {resumo['atualizados']}, "
+              f"sem rosto: {resumo['sem_rosto']}, arquivos ausentes: {resumo['ausentes']}")
+    if args.compactar:
+        apagados = compactar_reconhecimentos(args.reter_dias, args.vacuum)
+        print(f"Reconhecimentos apagados: {apagados}")
+    if not (args.backfill or args.forcar or args.compactar):
+        parser.print_help()
@@ -0,0 +1,86 @@
+import os
+import time
+import argparse
+import tempfile
+import threading
+import numpy as np
+import banco
+
+
+def fluxo(escritor, fonte, fps, rostos, duracao, contagem):
+    # Simula uma câmera: `rostos` reconhecimentos por frame, `fps` frames por segundo
+    intervalo = 1.0 / fps if fps else 0.0
+    fim = time.perf_counter() + duracao
+    proximo = time.perf_counter()
+    enviados = 0
+    while time.perf_counter() < fim:
+        for i in range(rostos):
+            escritor.registrar(1 + i, 0.4, fonte)
+        enviados += rostos
+        if intervalo:
+            proximo += intervalo
+            espera = proximo - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+    contagem[fonte] = enviados
+
+
+def cadastros(duracao, latencias):
+    rng = np.random.default_rng(0)
+    fim = time.perf_counter() + duracao
+    while time.perf_counter() < fim:
+        inicio = time.perf_counter()
+        banco.salvar_usuario_no_banco("bench", "inexistente.jpg", rng.standard_normal(128))
+        latencias.append(time.perf_counter() - inicio)
+        time.sleep(0.01)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inserções de reconhecimentos com cadastros simultâneos.")
+    parser.add_argument("--fluxos", type=int, default=4)
+    parser.add_argument("--fps", type=float, default=30, help="0 = o mais rápido possível")
+    parser.add_argument("--rostos", type=int, default=3, help="reconhecimentos por frame")
+    parser.add_argument("--duracao", type=float, default=10)
+    parser.add_argument("--max-eventos", type=int, default=500)
+    parser.add_argument("--intervalo-ms", type=float, default=250)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        banco.DB_PATH = os.path.join(pasta, "bench.db")
+        banco.inicializar_banco()
+        escritor = banco.EscritorReconhecimentos(args.max_eventos, args.intervalo_ms)
+
+        contagem, latencias = {}, []
+        threads = [threading.Thread(target=fluxo, args=(escritor, f"camera {i}", args.fps,
+                                                        args.rostos, args.duracao, contagem))
+                   for i in range(args.fluxos)]
+        threads.append(threading.Thread(target=cadastros, args=(args.duracao, latencias)))
+        inicio = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        envio = time.perf_counter() - inicio
+
+        inicio_fechamento = time.perf_counter()
+        escritor.fechar()
+        atraso = time.perf_counter() - inicio_fechamento
+        total = time.perf_counter() - inicio
+
+        enviados = sum(contagem.values())
+        gravados = banco.conexao().execute('SELECT COUNT(*) FROM reconhecimentos').fetchone()[0]
+        banco.fechar_conexao()
+
+    latencias_ms = np.array(latencias) * 1000
+    print(f"Fluxos: {args.fluxos} x {args.fps:g} FPS x {args.rostos} rostos, {args.duracao:g}s")
+    print(f"Eventos enviados: {enviados} ({enviados / envio:.0f}/s), gravados: {gravados} "
+          f"em {escritor.lotes} lotes ({gravados / total:.0f}/s sustentados)")
+    print(f"Pendentes ao final: drenados em {atraso * 1000:.0f} ms; "
+          f"descartados: {escritor.descartados}, falhas de gravação: {escritor.falhas}")
+    if len(latencias_ms):
+        print(f"Cadastros simultâneos: {len(latencias_ms)}, latência p50={np.percentile(latencias_ms, 50):.1f} ms "
+              f"p95={np.percentile(latencias_ms, 95):.1f} ms max={latencias_ms.max():.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import numpy as np
+import cv2
+import banco
+from galeria import Galeria
+from indice import IndiceIVF
+from pipeline import EXTENSOES_IMAGEM
+
+PASTAS_FIXTURES = ("rostos_cadastrados", "ReconhecimentoFacial")
+RESOLUCOES = ((640, 480), (1280, 720), (1920, 1080))
+ROSTOS_POR_FRAME = (0, 1, 5, 10, 20)
+TAMANHOS_GALERIA = (100, 1000, 10000, 100000)
+TOLERANCIA_REGRESSAO = 0.15
+SEMENTE = 0
+ETAPAS = ("deteccao", "encoding", "casamento", "banco")
+
+
+def cronometrar(funcao, repeticoes, aquecimento=1):
+    """Roda `funcao` e devolve mediana, p95 e mínimo em ms, após descartar o aquecimento."""
+    for _ in range(aquecimento):
+        funcao()
+    duracoes = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        duracoes.append(time.perf_counter() - inicio)
+    duracoes = 1000 * np.array(duracoes)
+    return {"mediana_ms": float(np.median(duracoes)), "p95_ms": float(np.percentile(duracoes, 95)),
+            "minimo_ms": float(duracoes.min()), "repeticoes": repeticoes}
+
+
+def carregar_fixtures(fr, pastas=PASTAS_FIXTURES):
+    """Imagens cadastradas (RGB) e o recorte do rosto de cada uma, na ordem do nome do arquivo."""
+    imagens, recortes = [], []
+    for pasta in pastas:
+        if not os.path.isdir(pasta):
+            continue
+        for raiz, _, arquivos in sorted(os.walk(pasta)):
+            for arquivo in sorted(arquivos):
+                if os.path.splitext(arquivo)[1].lower() not in EXTENSOES_IMAGEM:
+                    continue
+                try:
+                    imagem = fr.load_image_file(os.path.join(raiz, arquivo))
+                except (OSError, ValueError):
+                    # Arquivos ilegíveis (ex.: ponteiros do Git LFS não baixados) ficam de fora
+                    continue
+                locais = fr.face_locations(imagem)
+                if len(locais) != 1:
+                    continue
+                topo, direita, base, esquerda = locais[0]
+                imagens.append((imagem, locais))
+                recortes.append(imagem[max(topo - 20, 0):base + 20, max(esquerda - 20, 0):direita + 20])
+    return imagens, recortes
+
+
+def frame_composto(recortes, quantidade, resolucao, rng):
+    """Fundo com ruído e `quantidade` rostos em células de uma grade, sem sobreposição."""
+    largura, altura = resolucao
+    frame = rng.integers(60, 190, (altura, largura, 3), dtype=np.uint8)
+    frame = cv2.GaussianBlur(frame, (0, 0), 5)
+    if quantidade == 0 or not recortes:
+        return frame
+    colunas = int(np.ceil(np.sqrt(quantidade * largura / altura)))
+    linhas = int(np.ceil(quantidade / colunas))
+    celula = min(largura // colunas, altura // linhas)
+    for posicao, c in enumerate(rng.permutation(colunas * linhas)[:quantidade]):
+        recorte = recortes[posicao % len(recortes)]
+        lado = int(celula * rng.uniform(0.7, 0.95))
+        rosto = cv2.resize(recorte, (lado, lado))
+        y = (c // colunas) * celula + (celula - lado) // 2
+        x = (c % colunas) * celula + (celula - lado) // 2
+        frame[y:y + lado, x:x + lado] = rosto
+    return frame
+
+
+def galeria_sintetica(n, rng):
+    dados = rng.standard_normal((n, banco.DIMENSAO_ENCODING)).astype(np.float32)
+    dados /= np.linalg.norm(dados, axis=1, keepdims=True)
+    return dados
+
+
+def medir_deteccao(fr, recortes, modelos, upsamples, repeticoes, rng):
+    resultados = {}
+    for resolucao in RESOLUCOES:
+        for quantidade in ROSTOS_POR_FRAME:
+            frame = frame_composto(recortes, quantidade, resolucao, rng)
+            for modelo in modelos:
+                for upsample in upsamples:
+                    chave = f"deteccao/{modelo}/upsample{upsample}/{resolucao[0]}x{resolucao[1]}/{quantidade}_rostos"
+                    encontrados = len(fr.face_locations(frame, upsample, modelo))
+                    resultados[chave] = {**cronometrar(lambda: fr.face_locations(frame, upsample, modelo),
+                                                       repeticoes),
+                                         "rostos_esperados": quantidade, "rostos_encontrados": encontrados}
+                    print(f"  {chave}: {resultados[chave]['mediana_ms']:.1f} ms ({encontrados}/{quantidade})")
+    return resultados
+
+
+def medir_encoding(fr, imagens, repeticoes):
+    resultados = {}
+    for jitters in (1, 10):
+        for modelo in ("small", "large"):
+            chave = f"encoding/jitters{jitters}/{modelo}"
+
+            def codificar():
+                for imagem, locais in imagens:
+                    fr.face_encodings(imagem, locais, jitters, modelo)
+
+            medida = cronometrar(codificar, repeticoes)
+            medida["por_rosto_ms"] = medida["mediana_ms"] / len(imagens)
+            resultados[chave] = medida
+            print(f"  {chave}: {medida['por_rosto_ms']:.1f} ms por rosto")
+    return resultados
+
+
+def medir_casamento(tamanhos, repeticoes, rng, rostos_por_frame=5):
+    resultados = {}
+    for n in tamanhos:
+        matriz = galeria_sintetica(n, rng)
+        consultas = matriz[rng.integers(0, n, rostos_por_frame)] + 0.02 * rng.standard_normal(
+            (rostos_por_frame, banco.DIMENSAO_ENCODING)).astype(np.float32)
+        galeria = Galeria(matriz, [""] * n, list(range(n)))
+        chave = f"casamento/exato/N{n}"
+        resultados[chave] = cronometrar(lambda: galeria.comparar(consultas), repeticoes)
+        print(f"  {chave}: {resultados[chave]['mediana_ms']:.3f} ms")
+        if n >= 10000:
+            indice = IndiceIVF.construir(matriz, np.arange(n))
+            chave = f"casamento/ivf/N{n}"
+            resultados[chave] = cronometrar(lambda: indice.buscar(consultas), repeticoes)
+            print(f"  {chave}: {resultados[chave]['mediana_ms']:.3f} ms")
+    return resultados
+
+
+def medir_banco(tamanhos, repeticoes, rng):
+    resultados = {}
+    caminho_original = banco.DB_PATH
+    with tempfile.TemporaryDirectory() as pasta:
+        try:
+            for n in tamanhos:
+                banco.fechar_conexao()
+                banco.DB_PATH = os.path.join(pasta, f"galeria_{n}.db")
+                banco.inicializar_banco()
+                banco.salvar_usuarios_no_banco((f"pessoa {i}", f"{i}.jpg", encoding)
+                                               for i, encoding in enumerate(galeria_sintetica(n, rng)))
+
+                def carregar():
+                    # Conexão nova a cada rodada: mede abrir o banco, não só a consulta
+                    banco.fechar_conexao()
+                    banco.carregar_galeria()
+
+                chave = f"banco/carregar_galeria/N{n}"
+                resultados[chave] = cronometrar(carregar, repeticoes)
+                print(f"  {chave}: {resultados[chave]['mediana_ms']:.1f} ms")
+        finally:
+            banco.fechar_conexao()
+            banco.DB_PATH = caminho_original
+    return resultados
+
+
+def ambiente():
+    versoes = {"python": platform.python_version(), "numpy": np.__version__, "opencv": cv2.__version__}
+    try:
+        import dlib
+        versoes["dlib"] = dlib.__version__
+        versoes["dlib_cuda"] = bool(dlib.DLIB_USE_CUDA)
+    except ImportError:
+        pass
+    return {"plataforma": platform.platform(), "processador": platform.processor(),
+            "cpus": os.cpu_count(), "versoes": versoes}
+
+
+def cnn_disponivel():
+    # Sem CUDA o detector cnn leva segundos por frame; só entra com --cnn
+    try:
+        import dlib
+        return bool(dlib.DLIB_USE_CUDA)
+    except ImportError:
+        return False
+
+
+def comparar(atual, base, tolerancia):
+    """Lista (chave, base_ms, atual_ms, variação) das medidas que pioraram além da tolerância."""
+    regressoes = []
+    for chave, medida in atual["resultados"].items():
+        anterior = base["resultados"].get(chave)
+        if not anterior or not anterior["mediana_ms"]:
+            continue
+        variacao = medida["mediana_ms"] / anterior["mediana_ms"] - 1
+        if variacao > tolerancia:
+            regressoes.append((chave, anterior["mediana_ms"], medida["mediana_ms"], variacao))
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de detecção, encoding, casamento e banco.")
+    parser.add_argument("--saida", default="bench_resultados.json", help="resultados em JSON")
+    parser.add_argument("--base", default=None, help="JSON de uma rodada anterior para comparar")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_REGRESSAO,
+                        help="piora relativa da mediana que conta como regressão (0.15 = 15%%)")
+    parser.add_argument("--etapas", nargs="+", default=list(ETAPAS), choices=ETAPAS)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--cnn", action="store_true", help="inclui o detector cnn mesmo sem CUDA")
+    parser.add_argument("--rapido", action="store_true", help="menos combinações, para conferir a suíte")
+    args = parser.parse_args()
+
+    # Um gerador por etapa: rodar uma etapa sozinha gera os mesmos dados da suíte completa
+    rng = {etapa: np.random.default_rng([SEMENTE, i]) for i, etapa in enumerate(ETAPAS)}
+    cv2.setRNGSeed(SEMENTE)
+    resultados = {}
+
+    if "deteccao" in args.etapas or "encoding" in args.etapas:
+        import face_recognition
+
+        imagens, recortes = carregar_fixtures(face_recognition)
+        if not imagens:
+            raise SystemExit(f"Nenhuma imagem com exatamente um rosto em {', '.join(PASTAS_FIXTURES)}.")
+        print(f"Fixtures: {len(imagens)} imagens cadastradas")
+        if "deteccao" in args.etapas:
+            modelos = ["hog"] + (["cnn"] if args.cnn or cnn_disponivel() else [])
+            upsamples = (0, 1) if args.rapido else (0, 1, 2)
+            print("Detecção:")
+            resultados.update(medir_deteccao(face_recognition, recortes, modelos, upsamples,
+                                             args.repeticoes, rng["deteccao"]))
+        if "encoding" in args.etapas:
+            print("Encoding:")
+            resultados.update(medir_encoding(face_recognition, imagens, args.repeticoes))
+    if "casamento" in args.etapas:
+        print("Casamento:")
+        tamanhos = TAMANHOS_GALERIA[:2] if args.rapido else TAMANHOS_GALERIA
+        resultados.update(medir_casamento(tamanhos, args.repeticoes * 10, rng["casamento"]))
+    if "banco" in args.etapas:
+        print("Banco:")
+        tamanhos = TAMANHOS_GALERIA[:2] if args.rapido else TAMANHOS_GALERIA[:3]
+        resultados.update(medir_banco(tamanhos, args.repeticoes, rng["banco"]))
+
+    atual = {"instante": time.time(), "semente": SEMENTE, "ambiente": ambiente(), "resultados": resultados}
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(atual, f, indent=2, ensure_ascii=False)
+    print(f"Resultados gravados em {args.saida}")
+
+    if args.base:
+        with open(args.base, encoding="utf-8") as f:
+            base = json.load(f)
+        if base.get("ambiente") != atual["ambiente"]:
+            print("Aviso: a base foi medida em outro ambiente; as diferenças podem não ser do código.")
+        regressoes = comparar(atual, base, args.tolerancia)
+        for chave, antes, depois, variacao in regressoes:
+            print(f"REGRESSÃO {chave}: {antes:.2f} ms -> {depois:.2f} ms (+{variacao:.0%})")
+        if regressoes:
+            sys.exit(1)
+        print(f"Sem regressões acima de {args.tolerancia:.0%} em relação a {args.base}")
+
+
+if __name__ == '__main__':
+    main()
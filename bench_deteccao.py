@@ -0,0 +1,61 @@
+import time
+import argparse
+import cv2
+from banco import inicializar_banco, carregar_galeria
+from indice import abrir_indice
+from metricas import TemposEtapas
+from pipeline import abrir_fonte
+from deteccao import EstrategiaDeteccao
+from qualidade import AvaliadorQualidade
+
+
+def medir(fonte, estrategia, max_frames):
+    captura, _ = abrir_fonte(fonte)
+    tempos = TemposEtapas()
+    inicio = time.perf_counter()
+    while estrategia.frames < max_frames:
+        ret, frame = captura.read()
+        if not ret or frame is None:
+            break
+        estrategia.processar(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), tempos)
+    duracao = time.perf_counter() - inicio
+    captura.release()
+    return estrategia.frames / duracao if duracao else 0.0, tempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara a detecção por frame com detecção espaçada + rastreamento.")
+    parser.add_argument("--fonte", required=True, help="arquivo de vídeo ou pasta de imagens")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--escala", type=float, default=0.5)
+    parser.add_argument("--intervalo", type=int, default=5)
+    parser.add_argument("--rastreador", default="kcf", choices=["kcf", "csrt", "fluxo"])
+    parser.add_argument("--reverificar", type=int, default=30)
+    args = parser.parse_args()
+
+    inicializar_banco()
+    ids, nomes, matriz = carregar_galeria()
+    indice = abrir_indice(ids, matriz)
+    nomes_por_id = dict(zip(ids, nomes))
+
+    estrategias = {
+        "por frame (atual)": EstrategiaDeteccao(indice, nomes_por_id, escala=1, intervalo=1, rastreador=None),
+        "reduzida + rastreamento": EstrategiaDeteccao(indice, nomes_por_id, escala=args.escala,
+                                                      intervalo=args.intervalo, rastreador=args.rastreador,
+                                                      reverificar=args.reverificar),
+        "reduzida + rastreamento + qualidade": EstrategiaDeteccao(indice, nomes_por_id, escala=args.escala,
+                                                                  intervalo=args.intervalo,
+                                                                  rastreador=args.rastreador,
+                                                                  reverificar=args.reverificar,
+                                                                  qualidade=AvaliadorQualidade()),
+    }
+    for nome, estrategia in estrategias.items():
+        fps, tempos = medir(args.fonte, estrategia, args.frames)
+        print(f"{nome}: {fps:.1f} FPS")
+        print(f"  {estrategia.relatorio()}")
+        for etapa, (contagem, media_ms) in sorted(tempos.resumo().items()):
+            print(f"  {etapa:<13} {contagem:>6} chamadas {media_ms:>9.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
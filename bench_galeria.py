@@ -0,0 +1,64 @@
+import time
+import argparse
+import numpy as np
+from galeria import Galeria, DIMENSAO_ENCODING, TOLERANCIA_PADRAO
+
+
+def encodings_aleatorios(n, rng):
+    # Encodings do dlib têm norma próxima de 1; normaliza para distâncias realistas
+    dados = rng.standard_normal((n, DIMENSAO_ENCODING)).astype(np.float32)
+    dados /= np.linalg.norm(dados, axis=1, keepdims=True)
+    return dados
+
+
+def varredura_dupla(rostos_conhecidos, encodings):
+    # Equivalente ao laço antigo: compare_faces + face_distance por rosto,
+    # cada um reconstruindo o array a partir da lista.
+    resultados = []
+    for encoding in encodings:
+        matches = list(np.linalg.norm(np.array(rostos_conhecidos) - encoding, axis=1) <= TOLERANCIA_PADRAO)
+        face_distances = np.linalg.norm(np.array(rostos_conhecidos) - encoding, axis=1)
+        best_match_index = np.argmin(face_distances)
+        resultados.append((best_match_index, matches[best_match_index]))
+    return resultados
+
+
+def cronometrar(funcao, repeticoes):
+    funcao()
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        funcao()
+    return (time.perf_counter() - inicio) / repeticoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark do casamento com a galeria.")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[10, 1000, 100000])
+    parser.add_argument("--rostos", type=int, default=4, help="rostos por frame")
+    parser.add_argument("--repeticoes", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'N':>8} {'antigo (ms)':>12} {'galeria (ms)':>13} {'top-5 (ms)':>11} {'ganho':>7}")
+    for n in args.tamanhos:
+        conhecidos = encodings_aleatorios(n, rng)
+        consultas = encodings_aleatorios(args.rostos, rng)
+        lista = [linha.astype(np.float64) for linha in conhecidos]
+        galeria = Galeria(conhecidos)
+
+        # Confere que a galeria escolhe o mesmo vizinho (a menos de empates em float32)
+        _, distancias, _ = galeria.comparar(consultas)
+        antigos = [i for i, _ in varredura_dupla(lista, consultas)]
+        esperadas = np.linalg.norm(conhecidos[antigos] - consultas, axis=1)
+        assert np.allclose(distancias, esperadas, atol=1e-3), "Galeria divergiu da varredura antiga"
+
+        repeticoes = max(1, args.repeticoes * 1000 // max(n, 1000))
+        t_antigo = cronometrar(lambda: varredura_dupla(lista, consultas), repeticoes)
+        t_galeria = cronometrar(lambda: galeria.comparar(consultas), repeticoes)
+        t_top_k = cronometrar(lambda: galeria.top_k(consultas, 5), repeticoes)
+        print(f"{n:>8} {t_antigo * 1e3:>12.3f} {t_galeria * 1e3:>13.3f} "
+              f"{t_top_k * 1e3:>11.3f} {t_antigo / t_galeria:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
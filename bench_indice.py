@@ -0,0 +1,73 @@
+import time
+import argparse
+import numpy as np
+from banco import DIMENSAO_ENCODING
+from indice import IndiceIVF
+
+
+def galeria_sintetica(n, rng):
+    # Encodings com norma ~1, como os do dlib
+    dados = rng.standard_normal((n, DIMENSAO_ENCODING)).astype(np.float32)
+    dados /= np.linalg.norm(dados, axis=1, keepdims=True)
+    return dados
+
+
+def consultas_sinteticas(galeria, quantidade, ruido, rng):
+    # Novas fotos de pessoas cadastradas: o encoding original com um desvio
+    escolhidos = rng.choice(len(galeria), quantidade, replace=False)
+    consultas = galeria[escolhidos] + ruido * rng.standard_normal((quantidade, DIMENSAO_ENCODING)).astype(np.float32)
+    return consultas.astype(np.float32)
+
+
+def busca_exata(galeria, consultas, k):
+    # Mesma conta de face_recognition.face_distance, consulta por consulta
+    ids = np.empty((len(consultas), k), dtype=np.int64)
+    for f, consulta in enumerate(consultas):
+        distancias = np.linalg.norm(galeria - consulta, axis=1)
+        ids[f] = np.argsort(distancias)[:k]
+    return ids
+
+
+def recall(aproximado, exato):
+    k = exato.shape[1]
+    acertos = sum(len(set(a[:k]) & set(e)) for a, e in zip(aproximado, exato))
+    return acertos / exato.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall/latência do índice IVF contra a busca exata.")
+    parser.add_argument("--tamanho", type=int, default=100000)
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--ruido", type=float, default=0.03,
+                        help="desvio por dimensão das consultas em relação ao cadastro")
+    parser.add_argument("--listas", type=int, default=None)
+    parser.add_argument("--sondas", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    galeria = galeria_sintetica(args.tamanho, rng)
+    consultas = consultas_sinteticas(galeria, args.consultas, args.ruido, rng)
+    ids = np.arange(args.tamanho)
+
+    inicio = time.perf_counter()
+    exatos = busca_exata(galeria, consultas, args.k)
+    t_exato = (time.perf_counter() - inicio) / args.consultas
+
+    inicio = time.perf_counter()
+    indice = IndiceIVF.construir(galeria, ids, n_listas=args.listas)
+    t_construcao = time.perf_counter() - inicio
+
+    print(f"N={args.tamanho}  listas={len(indice.centroides)}  construção={t_construcao:.1f}s  "
+          f"exato={t_exato * 1e3:.2f} ms/consulta")
+    print(f"{'sondas':>7} {'ms/consulta':>12} {'recall@1':>9} {f'recall@{args.k}':>9}")
+    for sondas in args.sondas:
+        inicio = time.perf_counter()
+        aproximados, _ = indice.buscar(consultas, k=args.k, n_sondas=sondas)
+        t_ivf = (time.perf_counter() - inicio) / args.consultas
+        print(f"{sondas:>7} {t_ivf * 1e3:>12.3f} {recall(aproximados[:, :1], exatos[:, :1]):>9.3f} "
+              f"{recall(aproximados, exatos):>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+import os
+import argparse
+from collections import defaultdict
+import numpy as np
+import cv2
+from galeria import Galeria, TOLERANCIA_PADRAO
+from importar import PASTA_PADRAO, nome_da_pessoa, listar_imagens
+from qualidade import AvaliadorQualidade, ROTULO_BAIXA_QUALIDADE
+
+
+def degradar(imagem, local, rng):
+    """Versões ruins da mesma foto, como as que a câmera entrega: borrada, escura e pequena."""
+    top, right, bottom, left = local
+    borrada = cv2.GaussianBlur(imagem, (0, 0), 3)
+    escura = (imagem * 0.2).astype(np.uint8)
+    fator = 24.0 / max(bottom - top, 1)
+    pequena = cv2.resize(imagem, (0, 0), fx=fator, fy=fator, interpolation=cv2.INTER_AREA)
+    local_pequeno = tuple(int(round(v * fator)) for v in local)
+    variantes = [("borrada", borrada, local), ("escura", escura, local), ("pequena", pequena, local_pequeno)]
+    return [variantes[i] for i in rng.permutation(len(variantes))]
+
+
+def carregar(pasta, fr):
+    """{nome: [(caminho, imagem, local)]} com as imagens de exatamente um rosto."""
+    pessoas = defaultdict(list)
+    for caminho in listar_imagens(pasta):
+        try:
+            imagem = fr.load_image_file(caminho)
+        except Exception:
+            continue
+        locais = fr.face_locations(imagem)
+        if len(locais) == 1:
+            pessoas[nome_da_pessoa(caminho, pasta)].append((caminho, imagem, locais[0]))
+    return pessoas
+
+
+def dividir(pessoas, fracao_teste, rng):
+    """Separa por pessoa: fotos de cadastro e fotos de teste, que nunca entram na galeria."""
+    cadastro, teste = {}, []
+    for nome, fotos in sorted(pessoas.items()):
+        if len(fotos) < 2:
+            continue
+        ordem = rng.permutation(len(fotos))
+        n_teste = max(1, int(round(len(fotos) * fracao_teste)))
+        teste += [(nome, *fotos[i][1:]) for i in ordem[:n_teste]]
+        cadastro[nome] = [fotos[i] for i in ordem[n_teste:]]
+    return cadastro, teste
+
+
+def montar_galerias(cadastro, fr, avaliador, k):
+    """Três formas de cadastrar cada pessoa a partir das mesmas fotos.
+
+    - "uma foto": a primeira foto, qualquer que seja (o cadastro antigo);
+    - "melhores K": as K fotos de maior nota, um encoding por foto;
+    - "centroide": a média dessas K.
+    """
+    galerias = {"uma foto": ([], []), f"melhores {k}": ([], []), "centroide": ([], [])}
+    chamadas = defaultdict(int)
+    for nome, fotos in cadastro.items():
+        encoding = fr.face_encodings(fotos[0][1], [fotos[0][2]])[0]
+        chamadas["uma foto"] += 1
+        galerias["uma foto"][0].append(encoding)
+        galerias["uma foto"][1].append(nome)
+
+        notas = [avaliador.avaliar(imagem, [local])[0] for _, imagem, local in fotos]
+        aprovadas = sorted((i for i, q in enumerate(notas) if q.motivo is None), key=lambda i: -notas[i].nota)[:k]
+        escolhidas = aprovadas or [0]
+        encodings = [fr.face_encodings(fotos[i][1], [fotos[i][2]])[0] for i in escolhidas]
+        chamadas[f"melhores {k}"] += len(encodings)
+        galerias[f"melhores {k}"][0].extend(encodings)
+        galerias[f"melhores {k}"][1].extend([nome] * len(encodings))
+        galerias["centroide"][0].append(np.mean(encodings, axis=0))
+        galerias["centroide"][1].append(nome)
+    chamadas["centroide"] = chamadas[f"melhores {k}"]
+    return {nome: Galeria(encodings, nomes) for nome, (encodings, nomes) in galerias.items()}, chamadas
+
+
+def avaliar(galeria, consultas, fr, avaliador, tolerancia):
+    """Acertos, erros (outra pessoa), desconhecidos e descartados pela qualidade."""
+    contagem = defaultdict(int)
+    for nome, imagem, local in consultas:
+        if avaliador is not None and avaliador.avaliar(imagem, [local])[0].motivo:
+            contagem["descartados"] += 1
+            continue
+        encoding = fr.face_encodings(imagem, [local])[0]
+        contagem["encodings"] += 1
+        previsto, _ = galeria.identificar([encoding], tolerancia)[0]
+        if previsto == nome:
+            contagem["acertos"] += 1
+        elif previsto in ("Desconhecido", ROTULO_BAIXA_QUALIDADE):
+            contagem["desconhecidos"] += 1
+        else:
+            contagem["erros"] += 1
+    return contagem
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Acurácia e encodings evitados com o filtro de qualidade "
+                                                 "e o cadastro com várias amostras.")
+    parser.add_argument("pasta", nargs="?", default=PASTA_PADRAO,
+                        help="pasta com <Nome>.jpg, <Nome> (2).jpg ou <Nome>/<foto>.jpg, várias fotos por pessoa")
+    parser.add_argument("--teste", type=float, default=0.3, help="fração das fotos de cada pessoa reservada para teste")
+    parser.add_argument("--amostras", type=int, default=5)
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_PADRAO)
+    parser.add_argument("--sem-degradar", action="store_true",
+                        help="testa só as fotos originais, sem as versões borrada/escura/pequena")
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args()
+
+    import face_recognition
+
+    if not os.path.isdir(args.pasta):
+        raise SystemExit(f"Pasta {args.pasta} não encontrada.")
+    rng = np.random.default_rng(args.semente)
+    cadastro, originais = dividir(carregar(args.pasta, face_recognition), args.teste, rng)
+    if not cadastro:
+        raise SystemExit("São necessárias pelo menos duas fotos legíveis de alguma pessoa.")
+
+    consultas = list(originais)
+    if not args.sem_degradar:
+        for nome, imagem, local in originais:
+            consultas += [(nome, variante, local_variante)
+                          for _, variante, local_variante in degradar(imagem, local, rng)]
+    print(f"Pessoas: {len(cadastro)}, fotos de cadastro: {sum(len(f) for f in cadastro.values())}, "
+          f"consultas: {len(consultas)} ({len(originais)} originais)")
+
+    galerias, chamadas_cadastro = montar_galerias(cadastro, face_recognition, AvaliadorQualidade(), args.amostras)
+    print(f"{'cadastro':<12} {'filtro':<6} {'encodings':>9} {'evitados':>8} {'acertos':>8} "
+          f"{'erros':>6} {'desconh.':>8} {'acurácia':>9} {'precisão':>9}")
+    for nome_galeria, galeria in galerias.items():
+        for filtro in (False, True):
+            avaliador = AvaliadorQualidade() if filtro else None
+            c = avaliar(galeria, consultas, face_recognition, avaliador, args.tolerancia)
+            decididos = c["acertos"] + c["erros"]
+            print(f"{nome_galeria:<12} {'sim' if filtro else 'não':<6} {c['encodings']:>9} {c['descartados']:>8} "
+                  f"{c['acertos']:>8} {c['erros']:>6} {c['desconhecidos']:>8} "
+                  f"{c['acertos'] / len(consultas):>9.1%} {c['acertos'] / max(decididos, 1):>9.1%}")
+    print("Encodings no cadastro: " + ", ".join(f"{nome}: {n}" for nome, n in chamadas_cadastro.items()))
+    print("Acurácia = acertos / consultas; precisão = acertos / (acertos + erros). "
+          "Consultas descartadas pelo filtro não viram falso reconhecimento.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import os
+import time
+from collections import namedtuple
+import numpy as np
+import cv2
+from qualidade import AvaliadorQualidade
+
+JANELA_CADASTRO = 3.0
+AMOSTRAS_CADASTRO = 5
+# Espaço mínimo entre amostras, para variar um pouco expressão e pose
+INTERVALO_AMOSTRAS = 0.15
+
+Amostra = namedtuple("Amostra", "frame local qualidade")
+
+
+def coletar_amostras(captura, avaliador=None, k=AMOSTRAS_CADASTRO, duracao=JANELA_CADASTRO,
+                     intervalo=INTERVALO_AMOSTRAS, janela=None):
+    """Lê a câmera por `duracao` segundos e devolve as `k` melhores amostras, da melhor para a pior.
+
+    Só entram frames com exatamente um rosto aprovado pelo avaliador. A
+    detecção e a nota são baratas; o encoding fica para `salvar_amostras`,
+    que roda só nas `k` escolhidas.
+    """
+    import face_recognition
+
+    avaliador = avaliador or AvaliadorQualidade()
+    amostras = []
+    ultima = 0.0
+    fim = time.perf_counter() + duracao
+    while time.perf_counter() < fim:
+        ret, frame = captura.read()
+        if not ret or frame is None:
+            break
+        agora = time.perf_counter()
+        if agora - ultima >= intervalo:
+            ultima = agora
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            locais = face_recognition.face_locations(rgb_frame)
+            if len(locais) == 1:
+                qualidade = avaliador.avaliar(rgb_frame, locais)[0]
+                if qualidade.motivo is None:
+                    amostras.append(Amostra(frame.copy(), locais[0], qualidade))
+                    amostras.sort(key=lambda a: a.qualidade.nota, reverse=True)
+                    del amostras[k:]
+        if janela:
+            restante = max(fim - time.perf_counter(), 0)
+            cv2.putText(frame, f"Amostras: {len(amostras)}/{k}  ({restante:.1f}s)", (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
+            cv2.imshow(janela, frame)
+            cv2.waitKey(1)
+    return amostras
+
+
+def caminho_livre(pasta, nome):
+    """Primeiro de <nome>.jpg, <nome> (2).jpg, ... que ainda não existe.
+
+    Nunca sobrescreve a imagem de um cadastro anterior com o mesmo nome: a
+    linha antiga continua apontando para ela, e o atualizar_encodings a
+    recodificaria a partir do rosto novo.
+    """
+    posicao = 1
+    while True:
+        caminho = os.path.join(pasta, f"{nome}.jpg" if posicao == 1 else f"{nome} ({posicao}).jpg")
+        if not os.path.exists(caminho):
+            return caminho
+        posicao += 1
+
+
+def salvar_amostras(nome, amostras, pasta, centroide=False):
+    """Codifica as amostras e grava no banco; retorna [(id_usuario, encoding)].
+
+    Cada amostra vira uma linha com a sua imagem, nomeada como no
+    importar.py, e a busca fica com a mais próxima. Com `centroide`, grava
+    uma linha só com a média dos encodings e apenas a melhor imagem, marcada
+    para o atualizar_encodings não trocar a média pelo encoding dessa imagem.
+    """
+    import face_recognition
+    from banco import ORIGEM_CENTROIDE, salvar_usuario_no_banco
+
+    encodings = [face_recognition.face_encodings(cv2.cvtColor(a.frame, cv2.COLOR_BGR2RGB), [a.local])[0]
+                 for a in amostras]
+    if centroide:
+        media = np.mean(encodings, axis=0)
+        caminho = _gravar_recorte(pasta, nome, amostras[0])
+        return [(salvar_usuario_no_banco(nome, caminho, media, origem=ORIGEM_CENTROIDE), media)]
+    return [(salvar_usuario_no_banco(nome, _gravar_recorte(pasta, nome, amostra), encoding), encoding)
+            for amostra, encoding in zip(amostras, encodings)]
+
+
+def _gravar_recorte(pasta, nome, amostra):
+    top, right, bottom, left = amostra.local
+    caminho = caminho_livre(pasta, nome)
+    cv2.imwrite(caminho, amostra.frame[top:bottom, left:right])
+    return caminho
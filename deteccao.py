@@ -0,0 +1,248 @@
+import threading
+import numpy as np
+import cv2
+from galeria import TOLERANCIA_PADRAO
+from qualidade import ROTULO_BAIXA_QUALIDADE
+
+LARGURA_CENA = 64
+IOU_MINIMO = 0.3
+
+
+def caixa_para_local(caixa, escala):
+    """(x, y, w, h) na escala de detecção -> (top, right, bottom, left) na resolução original."""
+    x, y, w, h = caixa
+    return (int(round(y / escala)), int(round((x + w) / escala)),
+            int(round((y + h) / escala)), int(round(x / escala)))
+
+
+def limitar_local(local, forma):
+    top, right, bottom, left = local
+    altura, largura = forma[:2]
+    return (max(top, 0), min(right, largura), min(bottom, altura), max(left, 0))
+
+
+def local_para_caixa(local):
+    top, right, bottom, left = local
+    return (left, top, right - left, bottom - top)
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    largura = min(ax + aw, bx + bw) - max(ax, bx)
+    altura = min(ay + ah, by + bh) - max(ay, by)
+    if largura <= 0 or altura <= 0:
+        return 0.0
+    intersecao = largura * altura
+    return intersecao / float(aw * ah + bw * bh - intersecao)
+
+
+class RastreadorFluxo:
+    """Rastreador por fluxo óptico (Lucas-Kanade) com a mesma interface dos trackers do OpenCV.
+
+    Usado quando o OpenCV instalado não traz KCF/CSRT (opencv-contrib).
+    """
+
+    def init(self, frame, caixa):
+        self._cinza = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+        self._caixa = tuple(float(v) for v in caixa)
+        x, y, w, h = (int(v) for v in caixa)
+        mascara = np.zeros_like(self._cinza)
+        mascara[max(y, 0):y + h, max(x, 0):x + w] = 255
+        self._pontos = cv2.goodFeaturesToTrack(self._cinza, 30, 0.01, 3, mask=mascara)
+        return self._pontos is not None
+
+    def update(self, frame):
+        cinza = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+        if self._pontos is None or len(self._pontos) < 3:
+            return False, self._caixa
+        novos, status, _ = cv2.calcOpticalFlowPyrLK(self._cinza, cinza, self._pontos, None)
+        validos = status.ravel() == 1
+        if validos.sum() < 3:
+            return False, self._caixa
+
+        deslocamento = np.median(novos[validos] - self._pontos[validos], axis=0).ravel()
+        x, y, w, h = self._caixa
+        self._caixa = (x + deslocamento[0], y + deslocamento[1], w, h)
+        self._cinza = cinza
+        self._pontos = novos[validos].reshape(-1, 1, 2)
+        return True, self._caixa
+
+
+def criar_rastreador(tipo):
+    """Tracker KCF/CSRT do OpenCV, ou fluxo óptico se não houver suporte."""
+    if tipo in ("kcf", "csrt"):
+        nome = f"Tracker{tipo.upper()}_create"
+        for modulo in (cv2, getattr(cv2, "legacy", None)):
+            fabrica = getattr(modulo, nome, None) if modulo is not None else None
+            if fabrica is not None:
+                return fabrica()
+    return RastreadorFluxo()
+
+
+class Trilha:
+    def __init__(self, caixa, rastreador):
+        self.caixa = caixa
+        self.rastreador = rastreador
+        self.nome = None
+        self.distancia = None
+        self.id_usuario = None
+        self.frames_desde_verificacao = 0
+        self.baixa_qualidade = False
+
+
+class EstrategiaDeteccao:
+    """Detecção reduzida e espaçada, com rastreamento entre as detecções.
+
+    - detecta num frame reduzido por `escala` e mapeia as caixas de volta
+      para a resolução original;
+    - só roda a detecção completa a cada `intervalo` frames, quando a
+      cena muda (diferença média maior que `limiar_cena`) ou logo depois
+      que o tracker perde a última trilha, inclusive com a cena vazia;
+    - nos frames intermediários, cada rosto é seguido por um tracker barato;
+    - o encoding e a busca rodam uma vez por trilha, e de novo a cada
+      `reverificar` frames, em vez de uma vez por rosto por frame.
+
+    Com um `qualidade` (AvaliadorQualidade), rostos pequenos, borrados, mal
+    expostos ou de perfil não são codificados: a trilha fica marcada e é
+    avaliada de novo depois de `intervalo` frames.
+
+    `escala=1, intervalo=1, rastreador=None` reproduz o comportamento antigo.
+    """
+
+    def __init__(self, indice, nomes_por_id, escala=0.5, intervalo=5, limiar_cena=25.0,
+                 rastreador="kcf", reverificar=30, modelo="hog", tolerancia=TOLERANCIA_PADRAO, qualidade=None):
+        import face_recognition
+
+        self._fr = face_recognition
+        self.indice = indice
+        self.nomes_por_id = nomes_por_id
+        self.escala = escala
+        self.intervalo = intervalo
+        self.limiar_cena = limiar_cena
+        self.rastreador = rastreador
+        self.reverificar = reverificar
+        self.modelo = modelo
+        self.tolerancia = tolerancia
+        self.qualidade = qualidade
+        self.trilhas = []
+        self._cena_anterior = None
+        # O tracker perdeu a última trilha: procura de novo no frame seguinte
+        self._trilhas_perdidas = False
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.deteccoes = 0
+        self.rostos_codificados = 0
+        self.encodings_evitados = 0
+
+    def _mudou_cena(self, pequeno):
+        altura = int(pequeno.shape[0] * LARGURA_CENA / pequeno.shape[1]) or 1
+        cena = cv2.resize(cv2.cvtColor(pequeno, cv2.COLOR_RGB2GRAY), (LARGURA_CENA, altura)).astype(np.float32)
+        anterior, self._cena_anterior = self._cena_anterior, cena
+        return anterior is None or float(np.mean(np.abs(cena - anterior))) > self.limiar_cena
+
+    def _detectar(self, pequeno):
+        locais = self._fr.face_locations(pequeno, model=self.modelo)
+        caixas = [local_para_caixa(local) for local in locais]
+
+        # Trilhas que casam com uma detecção mantêm a identidade
+        novas = []
+        livres = list(self.trilhas)
+        for caixa in caixas:
+            melhor = max(livres, key=lambda t: iou(t.caixa, caixa), default=None)
+            if melhor is not None and iou(melhor.caixa, caixa) >= IOU_MINIMO:
+                livres.remove(melhor)
+                trilha = melhor
+                trilha.caixa = caixa
+            else:
+                trilha = Trilha(caixa, None)
+            if self.rastreador:
+                trilha.rastreador = criar_rastreador(self.rastreador)
+                trilha.rastreador.init(pequeno, caixa)
+            novas.append(trilha)
+        self.trilhas = novas
+        self.deteccoes += 1
+
+    def _rastrear(self, pequeno):
+        ativas = []
+        for trilha in self.trilhas:
+            ok, caixa = trilha.rastreador.update(pequeno)
+            if ok:
+                trilha.caixa = tuple(int(round(v)) for v in caixa)
+                ativas.append(trilha)
+        self._trilhas_perdidas = bool(self.trilhas) and not ativas
+        self.trilhas = ativas
+
+    def _selecionar(self, rgb_frame):
+        """Trilhas que precisam de encoding neste frame, e seus locais na resolução original."""
+        # Trilhas reprovadas na qualidade esperam `intervalo` frames antes de nova
+        # avaliação, no ritmo da detecção, em vez de pagar landmarks todo frame
+        pendentes = [t for t in self.trilhas
+                     if t.nome is None or t.frames_desde_verificacao >= self.reverificar
+                     or (t.baixa_qualidade and t.frames_desde_verificacao >= self.intervalo)]
+        locais = [limitar_local(caixa_para_local(t.caixa, self.escala), rgb_frame.shape) for t in pendentes]
+        if self.qualidade is None or not pendentes:
+            return pendentes, locais
+
+        aprovados, _ = self.qualidade.filtrar(rgb_frame, locais)
+        for i, trilha in enumerate(pendentes):
+            # Uma trilha já identificada mantém o nome até conseguir reverificar
+            trilha.baixa_qualidade = i not in aprovados
+            if trilha.baixa_qualidade:
+                trilha.frames_desde_verificacao = 0
+                if trilha.nome is None:
+                    trilha.nome = ROTULO_BAIXA_QUALIDADE
+        self.encodings_evitados += len(pendentes) - len(aprovados)
+        return [pendentes[i] for i in aprovados], [locais[i] for i in aprovados]
+
+    def _identificar(self, rgb_frame, pendentes, locais):
+        from indice import identificar
+
+        if pendentes:
+            encodings = self._fr.face_encodings(rgb_frame, locais)
+            identidades = identificar(self.indice, encodings, self.nomes_por_id, self.tolerancia)
+            for trilha, (nome, distancia, id_usuario) in zip(pendentes, identidades):
+                trilha.nome, trilha.distancia, trilha.id_usuario = nome, distancia, id_usuario
+                trilha.frames_desde_verificacao = 0
+            self.rostos_codificados += len(pendentes)
+
+    def processar(self, rgb_frame, tempos):
+        # Estado das trilhas é sequencial: com vários trabalhadores, um frame por vez
+        with self._lock:
+            with tempos.medir("reducao"):
+                if self.escala != 1:
+                    pequeno = cv2.resize(rgb_frame, (0, 0), fx=self.escala, fy=self.escala)
+                else:
+                    pequeno = rgb_frame
+
+            # A cena é comparada em todo frame para ter sempre o anterior
+            mudou_cena = self._mudou_cena(pequeno) if self.rastreador else True
+            if not self.rastreador:
+                # Sem rastreamento não há identidade reaproveitada entre frames
+                self.trilhas = []
+            # Cena vazia e parada também espera o intervalo: quem entra muda a cena
+            if mudou_cena or self._trilhas_perdidas or self.frames % self.intervalo == 0:
+                with tempos.medir("deteccao"):
+                    self._detectar(pequeno)
+                self._trilhas_perdidas = False
+            else:
+                with tempos.medir("rastreamento"):
+                    self._rastrear(pequeno)
+
+            with tempos.medir("qualidade"):
+                pendentes, locais = self._selecionar(rgb_frame)
+            with tempos.medir("encoding"):
+                self._identificar(rgb_frame, pendentes, locais)
+
+            self.frames += 1
+            for trilha in self.trilhas:
+                trilha.frames_desde_verificacao += 1
+            return [(limitar_local(caixa_para_local(t.caixa, self.escala), rgb_frame.shape),
+                     t.nome, t.distancia, t.id_usuario)
+                    for t in self.trilhas]
+
+    def relatorio(self):
+        frames = max(self.frames, 1)
+        return (f"Frames: {self.frames}, detecções: {self.deteccoes} ({self.deteccoes / frames:.2f}/frame), "
+                f"rostos codificados: {self.rostos_codificados} ({self.rostos_codificados / frames:.2f}/frame), "
+                f"evitados pela qualidade: {self.encodings_evitados} ({self.encodings_evitados / frames:.2f}/frame)")
@@ -0,0 +1,110 @@
+import numpy as np
+from banco import DIMENSAO_ENCODING
+
+TOLERANCIA_PADRAO = 0.6
+
+
+class Galeria:
+    """Encodings conhecidos numa matriz float32 (N, 128) pré-alocada.
+
+    As normas ao quadrado da galeria são calculadas uma vez, na inserção,
+    e todos os rostos de um frame são comparados de uma vez com uma única
+    multiplicação de matrizes (F x N), usando
+    |a - b|² = |a|² + |b|² - 2 a·b.
+    """
+
+    def __init__(self, encodings=None, nomes=None, ids=None, capacidade=16, copiar=True):
+        encodings = np.asarray(encodings if encodings is not None else [], dtype=np.float32)
+        encodings = encodings.reshape(-1, DIMENSAO_ENCODING)
+        n = len(encodings)
+
+        self.nomes = list(nomes) if nomes is not None else [None] * n
+        self.ids = list(ids) if ids is not None else list(range(n))
+        if len(self.nomes) != n or len(self.ids) != n:
+            raise ValueError("encodings, nomes e ids devem ter o mesmo tamanho.")
+
+        self._n = n
+        if copiar:
+            capacidade = max(capacidade, n)
+            self._matriz = np.empty((capacidade, DIMENSAO_ENCODING), dtype=np.float32)
+            self._matriz[:n] = encodings
+        else:
+            # Usa a matriz recebida (ex.: memória compartilhada) sem copiar;
+            # só é copiada se `adicionar` precisar crescer
+            self._matriz = encodings
+        self._normas = np.empty(len(self._matriz), dtype=np.float32)
+        self._normas[:n] = np.einsum("ij,ij->i", encodings, encodings)
+
+    @classmethod
+    def do_banco(cls):
+        from banco import carregar_galeria
+
+        ids, nomes, matriz = carregar_galeria()
+        return cls(matriz, nomes, ids)
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def matriz(self):
+        return self._matriz[:self._n]
+
+    def adicionar(self, encoding, nome, id_usuario=None):
+        if self._n == len(self._matriz):
+            nova_capacidade = max(16, 2 * len(self._matriz))
+            matriz = np.empty((nova_capacidade, DIMENSAO_ENCODING), dtype=np.float32)
+            normas = np.empty(nova_capacidade, dtype=np.float32)
+            matriz[:self._n] = self._matriz[:self._n]
+            normas[:self._n] = self._normas[:self._n]
+            self._matriz, self._normas = matriz, normas
+
+        vetor = np.asarray(encoding, dtype=np.float32).reshape(DIMENSAO_ENCODING)
+        self._matriz[self._n] = vetor
+        self._normas[self._n] = vetor @ vetor
+        self.nomes.append(nome)
+        self.ids.append(id_usuario if id_usuario is not None else self._n)
+        self._n += 1
+
+    def distancias(self, encodings):
+        """Matriz (F, N) de distâncias euclidianas entre os rostos e a galeria."""
+        consultas = np.asarray(encodings, dtype=np.float32).reshape(-1, DIMENSAO_ENCODING)
+        normas_consulta = np.einsum("ij,ij->i", consultas, consultas)
+        quadrados = normas_consulta[:, None] + self._normas[None, :self._n]
+        quadrados -= 2.0 * (consultas @ self.matriz.T)
+        np.maximum(quadrados, 0.0, out=quadrados)
+        return np.sqrt(quadrados, out=quadrados)
+
+    def comparar(self, encodings, tolerancia=TOLERANCIA_PADRAO):
+        """Retorna (indices, distancias, aceitos) do vizinho mais próximo de cada rosto.
+
+        Quando a galeria está vazia, os índices são -1 e as distâncias infinitas.
+        """
+        f = len(np.asarray(encodings).reshape(-1, DIMENSAO_ENCODING))
+        if self._n == 0 or f == 0:
+            indices = np.full(f, -1, dtype=np.intp)
+            distancias = np.full(f, np.inf, dtype=np.float32)
+            return indices, distancias, np.zeros(f, dtype=bool)
+
+        d = self.distancias(encodings)
+        indices = np.argmin(d, axis=1)
+        distancias = d[np.arange(f), indices]
+        return indices, distancias, distancias <= tolerancia
+
+    def top_k(self, encodings, k=5):
+        """Retorna (indices, distancias) dos k mais próximos, ordenados, formato (F, k)."""
+        d = self.distancias(encodings)
+        k = min(k, self._n)
+        if k == 0:
+            return np.empty((len(d), 0), dtype=np.intp), np.empty((len(d), 0), dtype=np.float32)
+
+        candidatos = np.argpartition(d, k - 1, axis=1)[:, :k]
+        dist_candidatos = np.take_along_axis(d, candidatos, axis=1)
+        ordem = np.argsort(dist_candidatos, axis=1)
+        return (np.take_along_axis(candidatos, ordem, axis=1),
+                np.take_along_axis(dist_candidatos, ordem, axis=1))
+
+    def identificar(self, encodings, tolerancia=TOLERANCIA_PADRAO, desconhecido="Desconhecido"):
+        """Nome (ou `desconhecido`) e distância para cada rosto do frame."""
+        indices, distancias, aceitos = self.comparar(encodings, tolerancia)
+        return [(self.nomes[i] if ok else desconhecido, float(dist))
+                for i, dist, ok in zip(indices, distancias, aceitos)]
@@ -0,0 +1,108 @@
+import os
+import re
+import csv
+import time
+import argparse
+from multiprocessing import Pool
+from banco import inicializar_banco, hash_arquivo, hashes_cadastrados, salvar_usuarios_no_banco
+from pipeline import EXTENSOES_IMAGEM
+
+PASTA_PADRAO = "ReconhecimentoFacial"
+# "Maria_2.jpg", "Maria (2).jpg" e "Maria-2.jpg" são todas fotos de "Maria"
+SUFIXO_NUMERADO = re.compile(r"[\s_-]*(\(\d+\)|\d+)$")
+
+
+def nome_da_pessoa(caminho, raiz):
+    """Pastas por pessoa (<raiz>/<Nome>/foto.jpg) ou arquivos soltos (<raiz>/<Nome>.jpg)."""
+    relativo = os.path.relpath(caminho, raiz)
+    partes = relativo.split(os.sep)
+    if len(partes) > 1:
+        return partes[0]
+    nome = os.path.splitext(partes[0])[0]
+    return SUFIXO_NUMERADO.sub("", nome) or nome
+
+
+def listar_imagens(raiz):
+    for pasta, _, arquivos in os.walk(raiz):
+        for arquivo in sorted(arquivos):
+            if arquivo.lower().endswith(EXTENSOES_IMAGEM):
+                yield os.path.join(pasta, arquivo)
+
+
+def codificar_imagem(tarefa):
+    """Roda no pool: detecta e codifica. Só aceita imagens com exatamente um rosto."""
+    import face_recognition
+
+    caminho, nome, hash_img, mtime, modelo, upsample = tarefa
+    try:
+        imagem = face_recognition.load_image_file(caminho)
+    except Exception as erro:
+        return caminho, nome, hash_img, mtime, None, f"imagem inválida: {erro}"
+
+    locais = face_recognition.face_locations(imagem, upsample, model=modelo)
+    if len(locais) != 1:
+        motivo = "nenhum rosto" if not locais else f"{len(locais)} rostos"
+        return caminho, nome, hash_img, mtime, None, motivo
+    encoding = face_recognition.face_encodings(imagem, locais)[0]
+    return caminho, nome, hash_img, mtime, encoding, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa em massa uma pasta de fotos nomeadas para o banco.")
+    parser.add_argument("pasta", nargs="?", default=PASTA_PADRAO,
+                        help="pasta com <Nome>.jpg ou <Nome>/<foto>.jpg (padrão: ReconhecimentoFacial)")
+    parser.add_argument("--processos", type=int, default=os.cpu_count())
+    parser.add_argument("--modelo", choices=["hog", "cnn"], default="hog")
+    parser.add_argument("--upsample", type=int, default=1)
+    parser.add_argument("--relatorio", default=None, help="CSV com as imagens rejeitadas e o motivo")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.pasta):
+        raise SystemExit(f"Pasta {args.pasta} não encontrada.")
+
+    inicializar_banco()
+    inicio = time.perf_counter()
+
+    # Idempotente: imagens já importadas (mesmo conteúdo) são puladas
+    vistos = hashes_cadastrados()
+    tarefas, repetidas = [], 0
+    for caminho in listar_imagens(args.pasta):
+        hash_img = hash_arquivo(caminho)
+        if hash_img in vistos:
+            repetidas += 1
+            continue
+        vistos.add(hash_img)
+        tarefas.append((caminho, nome_da_pessoa(caminho, args.pasta), hash_img,
+                        os.path.getmtime(caminho), args.modelo, args.upsample))
+
+    rejeitadas = []
+
+    def aceitas(resultados):
+        for caminho, nome, hash_img, mtime, encoding, motivo in resultados:
+            if motivo:
+                rejeitadas.append((caminho, motivo))
+            else:
+                yield nome, caminho, encoding, mtime, hash_img
+
+    with Pool(args.processos) as pool:
+        resultados = pool.imap_unordered(codificar_imagem, tarefas, chunksize=8)
+        # Codifica tudo antes de abrir a transação: gravar durante o pool seguraria o
+        # lock de escrita do banco por todo o import. Cada linha tem ~600 bytes.
+        registros = list(aceitas(resultados))
+    importadas = salvar_usuarios_no_banco(registros)
+
+    duracao = time.perf_counter() - inicio
+    print(f"Importadas: {importadas}, rejeitadas: {len(rejeitadas)}, já cadastradas: {repetidas}")
+    print(f"Tempo: {duracao:.1f}s, {len(tarefas) / duracao if duracao else 0:.1f} imagens/s")
+    for caminho, motivo in sorted(rejeitadas):
+        print(f"  rejeitada: {caminho} ({motivo})")
+
+    if args.relatorio:
+        with open(args.relatorio, "w", newline="", encoding="utf-8") as f:
+            escritor = csv.writer(f)
+            escritor.writerow(["arquivo", "motivo"])
+            escritor.writerows(sorted(rejeitadas))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,361 @@
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+from banco import DB_PATH, DIMENSAO_ENCODING
+from galeria import Galeria, TOLERANCIA_PADRAO
+
+# Abaixo deste tamanho a varredura exata é mais rápida que qualquer índice
+LIMITE_EXATO = 20000
+CAMINHO_INDICE = os.path.splitext(DB_PATH)[0] + ".indice"
+# Fração de inserções pendentes que dispara a reorganização das listas
+FRACAO_REORGANIZAR = 0.1
+
+
+def _distancias_quadradas(consultas, matriz, normas=None):
+    if normas is None:
+        normas = np.einsum("ij,ij->i", matriz, matriz)
+    d = np.einsum("ij,ij->i", consultas, consultas)[:, None] + normas[None, :]
+    d -= 2.0 * (consultas @ matriz.T)
+    return np.maximum(d, 0.0, out=d)
+
+
+def _menores_k(distancias, k):
+    k = min(k, distancias.shape[1])
+    candidatos = np.argpartition(distancias, k - 1, axis=1)[:, :k]
+    dist = np.take_along_axis(distancias, candidatos, axis=1)
+    ordem = np.argsort(dist, axis=1)
+    return np.take_along_axis(candidatos, ordem, axis=1), np.take_along_axis(dist, ordem, axis=1)
+
+
+def _completar(ids, distancias, k):
+    # Preenche com -1/inf quando há menos de k candidatos
+    falta = k - ids.shape[1]
+    if falta > 0:
+        ids = np.pad(ids, ((0, 0), (0, falta)), constant_values=-1)
+        distancias = np.pad(distancias, ((0, 0), (0, falta)), constant_values=np.inf)
+    return ids, distancias
+
+
+def kmeans(dados, k, iteracoes=15, amostra=256, semente=0):
+    """K-means simples em NumPy, treinado em no máximo `amostra` pontos por centróide."""
+    rng = np.random.default_rng(semente)
+    if len(dados) > amostra * k:
+        dados = dados[rng.choice(len(dados), amostra * k, replace=False)]
+    dados = np.ascontiguousarray(dados, dtype=np.float32)
+    centroides = dados[rng.choice(len(dados), k, replace=False)].copy()
+
+    for _ in range(iteracoes):
+        rotulos = atribuir(dados, centroides)
+        somas = np.zeros_like(centroides)
+        np.add.at(somas, rotulos, dados)
+        contagens = np.bincount(rotulos, minlength=k)
+        vazios = contagens == 0
+        centroides[~vazios] = somas[~vazios] / contagens[~vazios, None]
+        # Reinicia centróides vazios com pontos aleatórios
+        if vazios.any():
+            centroides[vazios] = dados[rng.choice(len(dados), int(vazios.sum()), replace=False)]
+    return centroides
+
+
+def atribuir(dados, centroides, bloco=65536):
+    normas = np.einsum("ij,ij->i", centroides, centroides)
+    rotulos = np.empty(len(dados), dtype=np.int64)
+    for inicio in range(0, len(dados), bloco):
+        parte = np.asarray(dados[inicio:inicio + bloco], dtype=np.float32)
+        rotulos[inicio:inicio + bloco] = np.argmin(_distancias_quadradas(parte, centroides, normas), axis=1)
+    return rotulos
+
+
+class IndiceExato:
+    """Varredura exata sobre a Galeria; usado para galerias pequenas."""
+
+    tipo = "exato"
+
+    def __init__(self, matriz, ids, copiar=True):
+        self.galeria = Galeria(matriz, ids=ids, nomes=ids, copiar=copiar)
+
+    def __len__(self):
+        return len(self.galeria)
+
+    def adicionar(self, id_usuario, encoding):
+        self.galeria.adicionar(encoding, id_usuario, id_usuario)
+
+    def buscar(self, encodings, k=1):
+        """Retorna (ids, distancias), ambos (F, k), ordenados pela distância."""
+        consultas = np.asarray(encodings, dtype=np.float32).reshape(-1, DIMENSAO_ENCODING)
+        if len(self.galeria) == 0:
+            return _completar(np.empty((len(consultas), 0), dtype=np.int64),
+                              np.empty((len(consultas), 0), dtype=np.float32), k)
+        posicoes, distancias = self.galeria.top_k(consultas, k)
+        ids = np.asarray(self.galeria.ids, dtype=np.int64)[posicoes]
+        return _completar(ids, distancias, k)
+
+
+class IndiceIVF:
+    """Índice de arquivo invertido (IVF) em NumPy puro.
+
+    Os encodings são agrupados por k-means em `n_listas` listas; a busca
+    compara a consulta com os centróides e faz a varredura exata apenas nas
+    `n_sondas` listas mais próximas. Mais sondas = mais recall e mais tempo.
+
+    Os vetores ficam ordenados por lista (`vetores`, `ids`, `offsets`), o
+    que permite salvar em arquivos .npy e abrir por mmap. Inserções novas
+    ficam num buffer à parte até a próxima reorganização.
+    """
+
+    tipo = "ivf"
+
+    def __init__(self, centroides, vetores, ids, offsets, n_sondas=8):
+        self.centroides = centroides
+        self.vetores = vetores
+        self.ids = ids
+        self.offsets = offsets
+        self.n_sondas = n_sondas
+        self._normas_centroides = np.einsum("ij,ij->i", centroides, centroides)
+        self._extra_vetores = []
+        self._extra_ids = []
+        self._extra_listas = []
+        self._base_alterada = False
+        self.versao = None
+
+    @classmethod
+    def construir(cls, matriz, ids, n_listas=None, n_sondas=8, iteracoes=15):
+        matriz = np.ascontiguousarray(matriz, dtype=np.float32)
+        ids = np.asarray(ids, dtype=np.int64)
+        if n_listas is None:
+            n_listas = max(1, int(4 * np.sqrt(len(matriz))))
+        n_listas = min(n_listas, len(matriz))
+
+        centroides = kmeans(matriz, n_listas, iteracoes)
+        rotulos = atribuir(matriz, centroides)
+        ordem = np.argsort(rotulos, kind="stable")
+        offsets = np.zeros(n_listas + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(rotulos, minlength=n_listas))
+
+        indice = cls(centroides, matriz[ordem], ids[ordem], offsets, n_sondas)
+        indice._base_alterada = True
+        return indice
+
+    def __len__(self):
+        return len(self.ids) + len(self._extra_ids)
+
+    def adicionar(self, id_usuario, encoding):
+        vetor = np.asarray(encoding, dtype=np.float32).reshape(1, DIMENSAO_ENCODING)
+        self._extra_vetores.append(vetor[0])
+        self._extra_ids.append(int(id_usuario))
+        self._extra_listas.append(int(atribuir(vetor, self.centroides)[0]))
+        if len(self._extra_ids) > FRACAO_REORGANIZAR * max(len(self.ids), 1):
+            self.reorganizar()
+
+    def reorganizar(self):
+        """Incorpora as inserções pendentes às listas (sem retreinar o k-means)."""
+        if not self._extra_ids:
+            return
+        n_listas = len(self.centroides)
+        rotulos = np.concatenate([
+            np.repeat(np.arange(n_listas), np.diff(self.offsets)),
+            np.asarray(self._extra_listas, dtype=np.int64),
+        ])
+        vetores = np.concatenate([np.asarray(self.vetores), np.stack(self._extra_vetores)])
+        ids = np.concatenate([np.asarray(self.ids), np.asarray(self._extra_ids, dtype=np.int64)])
+
+        ordem = np.argsort(rotulos, kind="stable")
+        self.vetores, self.ids = vetores[ordem], ids[ordem]
+        self.offsets = np.zeros(n_listas + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum(np.bincount(rotulos, minlength=n_listas))
+        self._extra_vetores, self._extra_ids, self._extra_listas = [], [], []
+        self._base_alterada = True
+
+    def buscar(self, encodings, k=1, n_sondas=None):
+        """Retorna (ids, distancias), ambos (F, k), ordenados pela distância."""
+        n_sondas = min(n_sondas or self.n_sondas, len(self.centroides))
+        consultas = np.asarray(encodings, dtype=np.float32).reshape(-1, DIMENSAO_ENCODING)
+        d_centroides = _distancias_quadradas(consultas, self.centroides, self._normas_centroides)
+        sondas = np.argpartition(d_centroides, n_sondas - 1, axis=1)[:, :n_sondas]
+
+        extra_vetores = np.stack(self._extra_vetores) if self._extra_ids else None
+        extra_listas = np.asarray(self._extra_listas, dtype=np.int64)
+        extra_ids = np.asarray(self._extra_ids, dtype=np.int64)
+
+        ids_saida = np.full((len(consultas), k), -1, dtype=np.int64)
+        dist_saida = np.full((len(consultas), k), np.inf, dtype=np.float32)
+        for f, consulta in enumerate(consultas):
+            partes = [np.arange(self.offsets[l], self.offsets[l + 1]) for l in sondas[f]]
+            posicoes = np.concatenate(partes)
+            candidatos = np.asarray(self.vetores[posicoes])
+            ids_candidatos = np.asarray(self.ids[posicoes])
+            if extra_vetores is not None:
+                mascara = np.isin(extra_listas, sondas[f])
+                candidatos = np.concatenate([candidatos, extra_vetores[mascara]])
+                ids_candidatos = np.concatenate([ids_candidatos, extra_ids[mascara]])
+            if len(candidatos) == 0:
+                continue
+
+            d = _distancias_quadradas(consulta[None, :], candidatos)
+            melhores, dist = _menores_k(d, k)
+            ids_saida[f, :melhores.shape[1]] = ids_candidatos[melhores[0]]
+            dist_saida[f, :melhores.shape[1]] = np.sqrt(dist[0])
+        return ids_saida, dist_saida
+
+    def salvar(self, caminho=CAMINHO_INDICE):
+        """Grava uma versão nova e só então troca o meta.json para apontar para ela.
+
+        Nenhum arquivo já gravado é sobrescrito: sessões abertas continuam
+        lendo (por mmap) a versão que carregaram, que segue consistente, e no
+        Windows não há escrita sobre um arquivo mapeado. A base (centróides e
+        listas) só ganha uma pasta nova quando muda; as inserções pendentes
+        ganham uma pasta nova a cada salvamento.
+        """
+        os.makedirs(caminho, exist_ok=True)
+        anterior = _ler_meta(caminho)
+        base = None if self._base_alterada else (anterior or {}).get("base")
+        if base is None or not os.path.exists(os.path.join(caminho, base, "vetores.npy")):
+            pasta = tempfile.mkdtemp(prefix="base-", dir=caminho)
+            for nome in ("centroides", "vetores", "ids", "offsets"):
+                np.save(os.path.join(pasta, f"{nome}.npy"), np.asarray(getattr(self, nome)))
+            base = os.path.basename(pasta)
+            self._base_alterada = False
+
+        pasta = tempfile.mkdtemp(prefix="extra-", dir=caminho)
+        np.save(os.path.join(pasta, "extra_vetores.npy"),
+                np.stack(self._extra_vetores) if self._extra_ids
+                else np.empty((0, DIMENSAO_ENCODING), dtype=np.float32))
+        np.save(os.path.join(pasta, "extra_ids.npy"), np.asarray(self._extra_ids, dtype=np.int64))
+        np.save(os.path.join(pasta, "extra_listas.npy"), np.asarray(self._extra_listas, dtype=np.int64))
+
+        meta = {"tipo": self.tipo, "n_sondas": self.n_sondas, "base": base, "extra": os.path.basename(pasta)}
+        temporario = os.path.join(caminho, "meta.json.tmp")
+        with open(temporario, "w") as f:
+            json.dump(meta, f)
+        os.replace(temporario, os.path.join(caminho, "meta.json"))
+        self.versao = meta["extra"]
+        _limpar_versoes(caminho, meta, anterior)
+
+    @classmethod
+    def carregar(cls, caminho=CAMINHO_INDICE):
+        """Abre a versão atual do índice; os vetores são mapeados em memória (mmap)."""
+        meta = _ler_meta(caminho)
+        # Índices gravados antes do versionamento têm os arquivos na própria pasta
+        base = os.path.join(caminho, meta.get("base", ""))
+        extra = os.path.join(caminho, meta.get("extra", ""))
+
+        def abrir(pasta, nome, mmap=True):
+            return np.load(os.path.join(pasta, f"{nome}.npy"), mmap_mode="r" if mmap else None)
+
+        indice = cls(abrir(base, "centroides", False), abrir(base, "vetores"), abrir(base, "ids"),
+                     abrir(base, "offsets", False), meta["n_sondas"])
+        indice._extra_vetores = list(abrir(extra, "extra_vetores", False))
+        indice._extra_ids = [int(i) for i in abrir(extra, "extra_ids", False)]
+        indice._extra_listas = [int(l) for l in abrir(extra, "extra_listas", False)]
+        indice.versao = meta.get("extra")
+        return indice
+
+    def vetores_por_id(self):
+        ids = np.concatenate([np.asarray(self.ids), np.asarray(self._extra_ids, dtype=np.int64)])
+        vetores = np.asarray(self.vetores)
+        if self._extra_ids:
+            vetores = np.concatenate([vetores, np.stack(self._extra_vetores)])
+        return ids, vetores
+
+
+def _ler_meta(caminho):
+    try:
+        with open(os.path.join(caminho, "meta.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _limpar_versoes(caminho, atual, anterior):
+    """Apaga as versões que não são a atual nem a anterior.
+
+    A anterior fica para quem leu o meta.json antigo e ainda está abrindo os
+    arquivos. No Windows uma versão ainda mapeada por outra sessão não pode
+    ser apagada; ela fica para a próxima limpeza.
+    """
+    manter = {atual["base"], atual["extra"]}
+    if anterior:
+        manter |= {anterior.get("base"), anterior.get("extra")}
+    for nome in os.listdir(caminho):
+        pasta = os.path.join(caminho, nome)
+        if nome in manter or not nome.startswith(("base-", "extra-")) or not os.path.isdir(pasta):
+            continue
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+def recarregar_se_mudou(indice, caminho=CAMINHO_INDICE):
+    """O mesmo índice, ou a versão nova se outro processo salvou desde o carregamento."""
+    meta = _ler_meta(caminho)
+    if meta is None or meta.get("extra") == getattr(indice, "versao", None):
+        return indice
+    return IndiceIVF.carregar(caminho)
+
+
+def criar_indice(matriz, ids, limite_exato=LIMITE_EXATO, **parametros):
+    if len(matriz) < limite_exato:
+        return IndiceExato(matriz, ids)
+    return IndiceIVF.construir(matriz, ids, **parametros)
+
+
+def abrir_indice(ids, matriz, caminho=CAMINHO_INDICE, limite_exato=LIMITE_EXATO):
+    """Índice para a galeria atual do banco.
+
+    Galerias pequenas usam a varredura exata. Para as grandes, reaproveita o
+    índice salvo em disco: inclui os usuários novos de forma incremental e só
+    reconstrói se algum encoding indexado foi removido ou alterado.
+    """
+    if len(matriz) < limite_exato:
+        return IndiceExato(matriz, ids)
+
+    ids = np.asarray(ids, dtype=np.int64)
+    indice = None
+    if os.path.exists(os.path.join(caminho, "meta.json")):
+        indice = IndiceIVF.carregar(caminho)
+        ids_indice, vetores_indice = indice.vetores_por_id()
+        posicao = {int(i): p for p, i in enumerate(ids)}
+        linhas = None
+        if all(int(i) in posicao for i in ids_indice):
+            linhas = np.fromiter((posicao[int(i)] for i in ids_indice), dtype=np.int64, count=len(ids_indice))
+            if not np.array_equal(matriz[linhas], vetores_indice):
+                linhas = None
+        # Os vetores comparados podem ser o próprio mmap: solta antes de salvar
+        del ids_indice, vetores_indice
+        if linhas is None:
+            indice = None
+        else:
+            novos = np.setdiff1d(np.arange(len(ids)), linhas, assume_unique=True)
+            for p in novos:
+                indice.adicionar(ids[p], matriz[p])
+            if len(novos):
+                indice.salvar(caminho)
+
+    if indice is None:
+        indice = IndiceIVF.construir(matriz, ids)
+        indice.salvar(caminho)
+    return indice
+
+
+def adicionar_ao_indice(id_usuario, encoding, caminho=CAMINHO_INDICE):
+    """Inclui um cadastro novo no índice salvo em disco, se houver um."""
+    if not os.path.exists(os.path.join(caminho, "meta.json")):
+        return
+    indice = IndiceIVF.carregar(caminho)
+    indice.adicionar(id_usuario, encoding)
+    indice.salvar(caminho)
+
+
+def identificar(indice, encodings, nomes_por_id, tolerancia=TOLERANCIA_PADRAO, desconhecido="Desconhecido"):
+    """(nome, distância, id) do vizinho mais próximo de cada rosto.
+
+    Rostos fora da tolerância recebem `desconhecido` e id None.
+    """
+    ids, distancias = indice.buscar(encodings, k=1)
+    resultado = []
+    for i, d in zip(ids[:, 0], distancias[:, 0]):
+        if i >= 0 and d <= tolerancia:
+            resultado.append((nomes_por_id[int(i)], float(d), int(i)))
+        else:
+            resultado.append((desconhecido, float(d), None))
+    return resultado
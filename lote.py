@@ -0,0 +1,286 @@
+import os
+import csv
+import json
+import time
+import hashlib
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+from banco import inicializar_banco, atualizar_encodings, carregar_galeria
+from galeria import TOLERANCIA_PADRAO
+from indice import LIMITE_EXATO, CAMINHO_INDICE, IndiceExato, IndiceIVF, abrir_indice
+from pipeline import EXTENSOES_IMAGEM
+
+EXTENSOES_VIDEO = (".mp4", ".avi", ".mkv", ".mov", ".webm", ".m4v")
+CAMPOS = ["arquivo", "frame", "instante", "top", "right", "bottom", "left", "id", "nome", "distancia"]
+
+# Estado de cada processo trabalhador, montado uma vez pelo inicializador
+_estado = {}
+
+
+def listar_entradas(caminhos):
+    """Expande pastas (recursivamente) em imagens e vídeos, em ordem estável."""
+    imagens, videos = [], []
+    for caminho in caminhos:
+        if os.path.isdir(caminho):
+            arquivos = sorted(os.path.join(raiz, nome)
+                              for raiz, _, nomes in os.walk(caminho) for nome in nomes)
+        else:
+            arquivos = [caminho]
+        for arquivo in arquivos:
+            extensao = os.path.splitext(arquivo)[1].lower()
+            if extensao in EXTENSOES_IMAGEM:
+                imagens.append(arquivo)
+            elif extensao in EXTENSOES_VIDEO:
+                videos.append(arquivo)
+    return imagens, videos
+
+
+def planejar_blocos(imagens, videos, tamanho_bloco):
+    """Divide o trabalho em blocos independentes; a ordem é determinística para a retomada."""
+    blocos = []
+    for inicio in range(0, len(imagens), tamanho_bloco):
+        blocos.append(("imagens", imagens[inicio:inicio + tamanho_bloco], 0, None))
+    for video in videos:
+        captura = cv2.VideoCapture(video)
+        total = int(captura.get(cv2.CAP_PROP_FRAME_COUNT))
+        captura.release()
+        if total <= 0:
+            # Contagem desconhecida (ex.: alguns .mkv): o vídeo vira um bloco só
+            blocos.append(("video", video, 0, None))
+            continue
+        for inicio in range(0, total, tamanho_bloco):
+            blocos.append(("video", video, inicio, min(inicio + tamanho_bloco, total)))
+    return blocos
+
+
+def _inicializar_trabalhador(ids, nomes, matriz, modelo, tamanho_lote, upsample, escala, tolerancia):
+    import face_recognition
+
+    if not ids:
+        indice = None
+    elif matriz is not None:
+        # Galeria pequena: a matriz já chega copiada ao processo pelo pickle
+        indice = IndiceExato(matriz, ids, copiar=False)
+    else:
+        # O processo principal já salvou o índice: aqui só se abre por mmap, sem escrever
+        indice = IndiceIVF.carregar(CAMINHO_INDICE)
+    _estado.update(fr=face_recognition, modelo=modelo, tamanho_lote=tamanho_lote,
+                   upsample=upsample, escala=escala, tolerancia=tolerancia,
+                   indice=indice, nomes_por_id=dict(zip(ids, nomes)))
+
+
+def _ler_frames(bloco, passo):
+    """Gera (arquivo, numero_frame, instante, frame_rgb) do bloco, decodificando sob demanda."""
+    tipo, origem, inicio, fim = bloco
+    if tipo == "imagens":
+        for arquivo in origem:
+            frame = cv2.imread(arquivo)
+            if frame is not None:
+                yield arquivo, 0, None, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return
+
+    captura = cv2.VideoCapture(origem)
+    fps = captura.get(cv2.CAP_PROP_FPS) or 0.0
+    if inicio:
+        captura.set(cv2.CAP_PROP_POS_FRAMES, inicio)
+    numero = inicio
+    while fim is None or numero < fim:
+        if numero % passo:
+            # Frames pulados só avançam o decodificador, sem converter
+            if not captura.grab():
+                break
+        else:
+            ret, frame = captura.read()
+            if not ret:
+                break
+            instante = numero / fps if fps else None
+            yield origem, numero, instante, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        numero += 1
+    captura.release()
+
+
+def _detectar_lote(frames):
+    fr, escala = _estado["fr"], _estado["escala"]
+    imagens = [f if escala == 1 else cv2.resize(f, (0, 0), fx=escala, fy=escala) for f in frames]
+    if _estado["modelo"] == "cnn":
+        # batch_face_locations exige imagens do mesmo tamanho: agrupa por formato
+        locais = [None] * len(imagens)
+        grupos = {}
+        for i, imagem in enumerate(imagens):
+            grupos.setdefault(imagem.shape, []).append(i)
+        for posicoes in grupos.values():
+            resultado = fr.batch_face_locations([imagens[i] for i in posicoes], _estado["upsample"],
+                                                batch_size=_estado["tamanho_lote"])
+            for i, rostos in zip(posicoes, resultado):
+                locais[i] = rostos
+    else:
+        locais = [fr.face_locations(imagem, _estado["upsample"], model="hog") for imagem in imagens]
+    if escala != 1:
+        locais = [[tuple(int(round(v / escala)) for v in local) for local in rostos] for rostos in locais]
+    return locais
+
+
+def _processar_lote(pendentes, linhas):
+    frames = [item[3] for item in pendentes]
+    for (arquivo, numero, instante, frame), locais in zip(pendentes, _detectar_lote(frames)):
+        if not locais:
+            continue
+        encodings = _estado["fr"].face_encodings(frame, locais)
+        if _estado["indice"] is not None:
+            ids, distancias = _estado["indice"].buscar(encodings, k=1)
+        else:
+            ids = distancias = [[None]] * len(locais)
+        for (top, right, bottom, left), id_usuario, distancia in zip(locais, ids, distancias):
+            id_usuario, distancia = id_usuario[0], distancia[0]
+            conhecido = id_usuario is not None and id_usuario >= 0 and distancia <= _estado["tolerancia"]
+            linhas.append({
+                "arquivo": arquivo, "frame": numero, "instante": instante,
+                "top": top, "right": right, "bottom": bottom, "left": left,
+                "id": int(id_usuario) if conhecido else None,
+                "nome": _estado["nomes_por_id"][int(id_usuario)] if conhecido else "Desconhecido",
+                "distancia": float(distancia) if distancia is not None else None,
+            })
+
+
+def processar_bloco(bloco, passo):
+    """Roda no trabalhador: decodifica, detecta em lotes, codifica e identifica um bloco."""
+    linhas, pendentes, frames = [], [], 0
+    for item in _ler_frames(bloco, passo):
+        pendentes.append(item)
+        frames += 1
+        if len(pendentes) == _estado["tamanho_lote"]:
+            _processar_lote(pendentes, linhas)
+            pendentes = []
+    if pendentes:
+        _processar_lote(pendentes, linhas)
+    return frames, linhas
+
+
+class Saida:
+    """Escreve as linhas em JSONL ou CSV, em modo de acréscimo para permitir retomar."""
+
+    def __init__(self, caminho, formato, posicao=0):
+        existe = os.path.exists(caminho) and posicao > 0
+        self.arquivo = open(caminho, "r+" if existe else "w", newline="", encoding="utf-8")
+        if existe:
+            # Descarta o que foi escrito depois do último checkpoint
+            self.arquivo.seek(posicao)
+            self.arquivo.truncate()
+        self.formato = formato
+        if formato == "csv":
+            self._csv = csv.DictWriter(self.arquivo, fieldnames=CAMPOS)
+            if not existe:
+                self._csv.writeheader()
+
+    def escrever(self, linhas):
+        for linha in linhas:
+            if self.formato == "csv":
+                self._csv.writerow(linha)
+            else:
+                self.arquivo.write(json.dumps(linha, ensure_ascii=False) + "\n")
+        self.arquivo.flush()
+        os.fsync(self.arquivo.fileno())
+        return self.arquivo.tell()
+
+    def fechar(self):
+        self.arquivo.close()
+
+
+def ler_checkpoint(caminho, assinatura):
+    if not caminho or not os.path.exists(caminho):
+        return 0, 0
+    with open(caminho, encoding="utf-8") as f:
+        dados = json.load(f)
+    if dados.get("assinatura") != assinatura:
+        raise SystemExit(f"O checkpoint {caminho} é de outra execução (entradas ou parâmetros diferentes).")
+    return dados["blocos_concluidos"], dados["posicao_saida"]
+
+
+def salvar_checkpoint(caminho, assinatura, blocos_concluidos, posicao_saida):
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump({"assinatura": assinatura, "blocos_concluidos": blocos_concluidos,
+                   "posicao_saida": posicao_saida}, f)
+    os.replace(temporario, caminho)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconhecimento em lote sobre pastas de imagens e vídeos.")
+    parser.add_argument("entradas", nargs="+", help="pastas, imagens ou arquivos de vídeo")
+    parser.add_argument("--saida", required=True, help="arquivo .jsonl ou .csv")
+    parser.add_argument("--formato", choices=["jsonl", "csv"], default=None,
+                        help="padrão: pela extensão de --saida")
+    parser.add_argument("--modelo", choices=["hog", "cnn"], default="hog")
+    parser.add_argument("--tamanho-lote", type=int, default=32,
+                        help="frames por chamada de batch_face_locations (modelo cnn)")
+    parser.add_argument("--upsample", type=int, default=1)
+    parser.add_argument("--escala", type=float, default=1.0, help="escala dos frames na detecção")
+    parser.add_argument("--passo", type=int, default=1, help="processa 1 a cada N frames dos vídeos")
+    parser.add_argument("--bloco", type=int, default=256, help="frames (ou imagens) por tarefa")
+    parser.add_argument("--processos", type=int, default=os.cpu_count())
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_PADRAO)
+    parser.add_argument("--checkpoint", default=None,
+                        help="arquivo de checkpoint (padrão: <saida>.checkpoint); use --sem-checkpoint para desativar")
+    parser.add_argument("--sem-checkpoint", action="store_true")
+    args = parser.parse_args()
+
+    formato = args.formato or ("csv" if args.saida.lower().endswith(".csv") else "jsonl")
+    checkpoint = None if args.sem_checkpoint else (args.checkpoint or args.saida + ".checkpoint")
+
+    inicializar_banco()
+    atualizar_encodings()
+    ids, nomes, matriz = carregar_galeria()
+    # Só o processo principal atualiza o índice em disco; os trabalhadores apenas leem
+    if ids:
+        abrir_indice(ids, matriz)
+    matriz_trabalhadores = matriz if len(ids) < LIMITE_EXATO else None
+
+    imagens, videos = listar_entradas(args.entradas)
+    blocos = planejar_blocos(imagens, videos, args.bloco)
+    # Identifica a execução: mesmas entradas e parâmetros geram os mesmos blocos
+    assinatura = hashlib.sha1(json.dumps([blocos, args.modelo, args.upsample, args.escala,
+                                          args.passo, args.tolerancia]).encode()).hexdigest()
+    concluidos, posicao = ler_checkpoint(checkpoint, assinatura)
+    if posicao and not os.path.exists(args.saida):
+        raise SystemExit(f"O checkpoint existe mas {args.saida} não; apague {checkpoint} para recomeçar.")
+    if concluidos:
+        print(f"Retomando do bloco {concluidos} de {len(blocos)}.")
+
+    saida = Saida(args.saida, formato, posicao)
+    inicio = time.perf_counter()
+    total_frames = total_rostos = 0
+    # No máximo 2 tarefas por processo em voo: a memória não cresce com o tamanho da entrada
+    em_voo = deque()
+    restantes = iter(blocos[concluidos:])
+    with ProcessPoolExecutor(args.processos, initializer=_inicializar_trabalhador,
+                             initargs=(ids, nomes, matriz_trabalhadores, args.modelo, args.tamanho_lote,
+                                       args.upsample, args.escala, args.tolerancia)) as executor:
+        for bloco in restantes:
+            em_voo.append(executor.submit(processar_bloco, bloco, args.passo))
+            if len(em_voo) >= 2 * args.processos:
+                break
+        while em_voo:
+            # Resultados consumidos na ordem dos blocos, para o checkpoint ser um contador
+            frames, linhas = em_voo.popleft().result()
+            posicao = saida.escrever(linhas)
+            concluidos += 1
+            total_frames += frames
+            total_rostos += len(linhas)
+            if checkpoint:
+                salvar_checkpoint(checkpoint, assinatura, concluidos, posicao)
+
+            proximo = next(restantes, None)
+            if proximo is not None:
+                em_voo.append(executor.submit(processar_bloco, proximo, args.passo))
+
+    saida.fechar()
+    duracao = time.perf_counter() - inicio
+    print(f"Blocos: {concluidos}/{len(blocos)}, frames: {total_frames}, rostos: {total_rostos}")
+    print(f"Tempo: {duracao:.1f}s, {total_frames / duracao if duracao else 0:.1f} frames/s, "
+          f"{total_rostos / duracao if duracao else 0:.1f} rostos/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import pstats
+import cProfile
+import threading
+from collections import deque, defaultdict
+from contextlib import contextmanager, nullcontext
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+
+JANELA_PADRAO = 1000
+PERCENTIS = (50, 95, 99)
+_NULO = nullcontext()
+
+
+class TemposEtapas:
+    """Tempos por etapa, contadores e medidores do laço de reconhecimento.
+
+    Cada etapa guarda total, contagem e uma janela com as últimas `janela`
+    durações, de onde saem p50/p95/p99. Com `ativo=False` todas as chamadas
+    retornam na hora e `medir` devolve um contexto vazio compartilhado,
+    então deixar a instrumentação no código não custa nada.
+    """
+
+    def __init__(self, ativo=True, janela=JANELA_PADRAO):
+        self.ativo = ativo
+        self._janela = janela
+        self._lock = threading.Lock()
+        self.totais = defaultdict(float)
+        self.contagens = defaultdict(int)
+        self._duracoes = defaultdict(lambda: deque(maxlen=self._janela))
+        self._observacoes = defaultdict(lambda: deque(maxlen=self._janela))
+        self._marcas = defaultdict(lambda: deque(maxlen=self._janela))
+        self.medidores = {}
+
+    def registrar(self, etapa, segundos):
+        if not self.ativo:
+            return
+        with self._lock:
+            self.totais[etapa] += segundos
+            self.contagens[etapa] += 1
+            self._duracoes[etapa].append(segundos)
+
+    @contextmanager
+    def _medir(self, etapa):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(etapa, time.perf_counter() - inicio)
+
+    def medir(self, etapa):
+        return self._medir(etapa) if self.ativo else _NULO
+
+    def observar(self, nome, valor):
+        """Valor por evento, ex.: rostos por frame."""
+        if self.ativo:
+            with self._lock:
+                self._observacoes[nome].append(valor)
+
+    def marcar(self, nome):
+        """Conta um evento para a taxa por segundo, ex.: frames processados."""
+        if self.ativo:
+            with self._lock:
+                self._marcas[nome].append(time.perf_counter())
+
+    def definir(self, nome, valor):
+        """Medidor com o último valor, ex.: tamanho da galeria."""
+        if self.ativo:
+            self.medidores[nome] = valor
+
+    def taxa(self, nome):
+        with self._lock:
+            marcas = self._marcas.get(nome)
+            if not marcas or len(marcas) < 2 or marcas[-1] == marcas[0]:
+                return 0.0
+            return (len(marcas) - 1) / (marcas[-1] - marcas[0])
+
+    def percentis(self, etapa):
+        with self._lock:
+            duracoes = np.fromiter(self._duracoes.get(etapa, ()), dtype=np.float64)
+        if len(duracoes) == 0:
+            return {p: 0.0 for p in PERCENTIS}
+        return dict(zip(PERCENTIS, 1000 * np.percentile(duracoes, PERCENTIS)))
+
+    def resumo(self):
+        """Compatível com o relatório antigo: {etapa: (contagem, média em ms)}."""
+        with self._lock:
+            return {etapa: (self.contagens[etapa], 1000 * self.totais[etapa] / self.contagens[etapa])
+                    for etapa in self.totais}
+
+    def instantaneo(self):
+        """Todas as métricas num dicionário pronto para JSON."""
+        etapas = {}
+        for etapa, (contagem, media_ms) in self.resumo().items():
+            p = self.percentis(etapa)
+            etapas[etapa] = {"contagem": contagem, "media_ms": media_ms,
+                             **{f"p{k}_ms": float(v) for k, v in p.items()}}
+        with self._lock:
+            observacoes = {nome: float(np.mean(valores)) for nome, valores in self._observacoes.items() if valores}
+            nomes_taxas = list(self._marcas)
+        return {"instante": time.time(), "etapas": etapas,
+                "taxas": {nome: self.taxa(nome) for nome in nomes_taxas},
+                "medias": observacoes, "medidores": dict(self.medidores)}
+
+    def prometheus(self, prefixo="reconhecimento"):
+        """As mesmas métricas no formato texto do Prometheus."""
+        dados = self.instantaneo()
+        linhas = [f"# TYPE {prefixo}_etapa_segundos summary"]
+        for etapa, valores in dados["etapas"].items():
+            for p in PERCENTIS:
+                linhas.append(f'{prefixo}_etapa_segundos{{etapa="{etapa}",quantile="{p / 100:g}"}} '
+                              f'{valores[f"p{p}_ms"] / 1000:.6f}')
+            linhas.append(f'{prefixo}_etapa_segundos_count{{etapa="{etapa}"}} {valores["contagem"]}')
+            linhas.append(f'{prefixo}_etapa_segundos_sum{{etapa="{etapa}"}} '
+                          f'{valores["media_ms"] * valores["contagem"] / 1000:.6f}')
+        for grupo, sufixo in (("taxas", "por_segundo"), ("medias", "media"), ("medidores", "")):
+            for nome, valor in dados[grupo].items():
+                metrica = f"{prefixo}_{nome}" + (f"_{sufixo}" if sufixo else "")
+                linhas.append(f"# TYPE {metrica} gauge")
+                linhas.append(f"{metrica} {valor:g}")
+        return "\n".join(linhas) + "\n"
+
+
+def desenhar_metricas(frame, tempos, etapas=("deteccao", "encoding", "casamento")):
+    """Sobrepõe FPS, rostos por frame e p95 das etapas principais no canto do frame."""
+    import cv2
+
+    dados = tempos.instantaneo()
+    linhas = [f"FPS {dados['taxas'].get('frames_processados', 0):.1f} / "
+              f"exibicao {dados['taxas'].get('frames_exibidos', 0):.1f}",
+              f"rostos/frame {dados['medias'].get('rostos_por_frame', 0):.1f}"]
+    if "galeria_tamanho" in dados["medidores"]:
+        linhas.append(f"galeria {dados['medidores']['galeria_tamanho']}")
+    for etapa in etapas:
+        if etapa in dados["etapas"]:
+            linhas.append(f"{etapa} p95 {dados['etapas'][etapa]['p95_ms']:.1f} ms")
+    for i, linha in enumerate(linhas):
+        cv2.putText(frame, linha, (10, 20 + 18 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
+
+
+class ExportadorMetricas:
+    """Grava as métricas periodicamente num arquivo e/ou serve num endpoint local.
+
+    O arquivo é JSON, ou texto do Prometheus se terminar em `.prom`. O
+    endpoint responde /metrics (Prometheus) e /metrics.json.
+    """
+
+    def __init__(self, tempos, caminho=None, porta=None, intervalo=5.0):
+        self.tempos = tempos
+        self.caminho = caminho
+        self.intervalo = intervalo
+        self._parar = threading.Event()
+        self._servidor = None
+        if porta:
+            self._servidor = ThreadingHTTPServer(("127.0.0.1", porta), _ManipuladorMetricas)
+            self._servidor.tempos = tempos
+            threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        self._thread = None
+        if caminho:
+            self._thread = threading.Thread(target=self._executar, daemon=True)
+            self._thread.start()
+
+    def gravar(self):
+        if self.caminho.endswith(".prom"):
+            conteudo = self.tempos.prometheus()
+        else:
+            conteudo = json.dumps(self.tempos.instantaneo(), indent=2)
+        temporario = self.caminho + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            f.write(conteudo)
+        os.replace(temporario, self.caminho)
+
+    def _executar(self):
+        while not self._parar.wait(self.intervalo):
+            self.gravar()
+
+    def fechar(self):
+        self._parar.set()
+        if self._thread:
+            self._thread.join()
+            self.gravar()
+        if self._servidor:
+            self._servidor.shutdown()
+
+
+class _ManipuladorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        tempos = self.server.tempos
+        if self.path == "/metrics":
+            corpo, tipo = tempos.prometheus(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            corpo, tipo = json.dumps(tempos.instantaneo()), "application/json"
+        else:
+            self.send_error(404)
+            return
+        dados = corpo.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+class Perfilador:
+    """cProfile para sessões com várias threads.
+
+    O cProfile só enxerga a thread em que foi ligado, então cada função
+    passada por `envolver` roda com um perfil próprio, e `salvar` junta
+    todos num único relatório.
+    """
+
+    def __init__(self):
+        self._perfis = []
+        self._lock = threading.Lock()
+
+    def envolver(self, alvo):
+        def executar(*args, **kwargs):
+            perfil = cProfile.Profile()
+            perfil.enable()
+            try:
+                return alvo(*args, **kwargs)
+            finally:
+                perfil.disable()
+                with self._lock:
+                    self._perfis.append(perfil)
+
+        return executar
+
+    def salvar(self, caminho, linhas=40):
+        """Grava `caminho` (texto, ordenado por tempo acumulado) e `caminho`.prof (pstats)."""
+        if not self._perfis:
+            return
+        with open(caminho, "w", encoding="utf-8") as f:
+            estatisticas = pstats.Stats(*self._perfis, stream=f)
+            estatisticas.dump_stats(caminho + ".prof")
+            estatisticas.sort_stats("cumulative").print_stats(linhas)
@@ -0,0 +1,375 @@
+import os
+import glob
+import time
+import argparse
+import threading
+from collections import deque, namedtuple
+import cv2
+from metricas import TemposEtapas, desenhar_metricas
+
+Resultado = namedtuple("Resultado", "numero instante rostos")
+EXTENSOES_IMAGEM = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+class FilaLimitada:
+    """Fila de tamanho fixo entre as etapas.
+
+    Com `descartar=True` (padrão) o item mais antigo é descartado quando a
+    fila está cheia, para que a etapa seguinte sempre pegue o frame mais
+    recente. Com `descartar=False` quem coloca espera (útil para processar
+    um vídeo inteiro sem perder frames).
+    """
+
+    def __init__(self, tamanho, descartar=True):
+        self._itens = deque()
+        self._tamanho = tamanho
+        self._descartar = descartar
+        self._cond = threading.Condition()
+        self._fechada = False
+        self.descartados = 0
+
+    def colocar(self, item):
+        with self._cond:
+            if not self._descartar:
+                self._cond.wait_for(lambda: len(self._itens) < self._tamanho or self._fechada)
+            elif len(self._itens) >= self._tamanho:
+                self._itens.popleft()
+                self.descartados += 1
+            self._itens.append(item)
+            self._cond.notify_all()
+
+    def tirar(self, timeout=None):
+        """Retorna o próximo item, ou None se a fila foi fechada/esvaziou no timeout."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._itens or self._fechada, timeout)
+            if not self._itens:
+                return None
+            item = self._itens.popleft()
+            self._cond.notify_all()
+            return item
+
+    def fechar(self):
+        with self._cond:
+            self._fechada = True
+            self._cond.notify_all()
+
+
+class SequenciaImagens:
+    """Pasta de imagens com a mesma interface de leitura do cv2.VideoCapture."""
+
+    def __init__(self, caminho, fps=30.0):
+        if os.path.isdir(caminho):
+            arquivos = [os.path.join(caminho, nome) for nome in os.listdir(caminho)]
+        else:
+            arquivos = glob.glob(caminho)
+        self.arquivos = sorted(a for a in arquivos if a.lower().endswith(EXTENSOES_IMAGEM))
+        self.fps = fps
+        self._posicao = 0
+
+    def isOpened(self):
+        return bool(self.arquivos)
+
+    def read(self):
+        while self._posicao < len(self.arquivos):
+            frame = cv2.imread(self.arquivos[self._posicao])
+            self._posicao += 1
+            if frame is not None:
+                return True, frame
+        return False, None
+
+    def get(self, propriedade):
+        if propriedade == cv2.CAP_PROP_FPS:
+            return self.fps
+        return 0.0
+
+    def release(self):
+        self._posicao = len(self.arquivos)
+
+
+def abrir_fonte(fonte):
+    """Abre um índice de câmera, arquivo de vídeo/URL ou pasta/glob de imagens."""
+    if isinstance(fonte, int) or str(fonte).isdigit():
+        return cv2.VideoCapture(int(fonte)), True
+    if os.path.isdir(fonte) or any(c in fonte for c in "*?["):
+        return SequenciaImagens(fonte), False
+    return cv2.VideoCapture(fonte), fonte.startswith(("rtsp://", "http://", "https://"))
+
+
+def desenhar_resultados(frame, rostos):
+    for (top, right, bottom, left), nome, *_ in rostos:
+        cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
+        cv2.rectangle(frame, (left, bottom - 35), (right, bottom), (0, 255, 0), cv2.FILLED)
+        cv2.putText(frame, nome, (left + 6, bottom - 6),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+
+
+def criar_processador(indice, nomes_por_id, qualidade=None):
+    """Detecção + encoding + busca no índice para um frame RGB.
+
+    Com um `qualidade` (AvaliadorQualidade), os rostos reprovados não são
+    codificados e saem com o rótulo de baixa qualidade.
+    """
+    import face_recognition
+    from indice import identificar
+    from qualidade import ROTULO_BAIXA_QUALIDADE
+
+    def processar(rgb_frame, tempos):
+        with tempos.medir("deteccao"):
+            locais = face_recognition.face_locations(rgb_frame)
+        aprovados = list(range(len(locais)))
+        if qualidade is not None and locais:
+            with tempos.medir("qualidade"):
+                aprovados, _ = qualidade.filtrar(rgb_frame, locais)
+        with tempos.medir("encoding"):
+            encodings = face_recognition.face_encodings(rgb_frame, [locais[i] for i in aprovados])
+        with tempos.medir("casamento"):
+            identidades = dict(zip(aprovados, identificar(indice, encodings, nomes_por_id)))
+        return [(local, *identidades.get(i, (ROTULO_BAIXA_QUALIDADE, None, None)))
+                for i, local in enumerate(locais)]
+
+    return processar
+
+
+def registrador(escritor, fonte):
+    """Callback `ao_resultado` que envia cada rosto reconhecido ao EscritorReconhecimentos."""
+    def ao_resultado(resultado):
+        for _, _, distancia, id_usuario in resultado.rostos:
+            if id_usuario is not None:
+                escritor.registrar(id_usuario, distancia, fonte, resultado.instante)
+
+    return ao_resultado
+
+
+class PipelineReconhecimento:
+    """Captura, detecção/encoding e exibição em etapas separadas.
+
+    - a thread de captura lê a fonte e mantém só o frame mais recente para
+      os trabalhadores e para a exibição;
+    - `trabalhadores` threads fazem a conversão de cor e chamam `processar`
+      (o dlib libera a GIL durante a detecção e o encoding);
+    - a exibição desenha o frame mais recente com o último resultado pronto,
+      então o FPS da janela não fica preso ao tempo de detecção.
+    """
+
+    def __init__(self, captura, processar, trabalhadores=2, tamanho_fila=1,
+                 descartar=True, ritmo=None, ao_resultado=None, tempos=None,
+                 sobreposicao=False, perfilador=None):
+        self.captura = captura
+        self.processar = processar
+        self.trabalhadores = trabalhadores
+        self.ritmo = ritmo
+        self.ao_resultado = ao_resultado
+        self.tempos = tempos if tempos is not None else TemposEtapas()
+        self.sobreposicao = sobreposicao
+        self.perfilador = perfilador
+        self.fila_frames = FilaLimitada(tamanho_fila, descartar)
+        self.fila_exibicao = FilaLimitada(1)
+        self.ultimo_resultado = Resultado(-1, 0.0, [])
+        self.frames_lidos = 0
+        self.frames_processados = 0
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._threads = []
+
+    def _capturar(self):
+        intervalo = 1.0 / self.ritmo if self.ritmo else 0.0
+        proximo = time.perf_counter()
+        numero = 0
+        while not self._parar.is_set():
+            with self.tempos.medir("captura"):
+                ret, frame = self.captura.read()
+            if not ret or frame is None:
+                break
+            item = (numero, time.time(), frame)
+            self.fila_frames.colocar(item)
+            self.fila_exibicao.colocar(item)
+            numero += 1
+            self.frames_lidos = numero
+
+            if intervalo:
+                proximo += intervalo
+                espera = proximo - time.perf_counter()
+                if espera > 0:
+                    time.sleep(espera)
+        self.fila_frames.fechar()
+        self.fila_exibicao.fechar()
+
+    def _trabalhar(self):
+        while True:
+            item = self.fila_frames.tirar()
+            if item is None:
+                break
+            numero, instante, frame = item
+            with self.tempos.medir("conversao"):
+                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            rostos = self.processar(rgb_frame, self.tempos)
+            resultado = Resultado(numero, instante, rostos)
+            self.tempos.marcar("frames_processados")
+            self.tempos.observar("rostos_por_frame", len(rostos))
+
+            with self._lock:
+                self.frames_processados += 1
+                # Com vários trabalhadores os resultados podem chegar fora de ordem
+                if numero > self.ultimo_resultado.numero:
+                    self.ultimo_resultado = resultado
+            if self.ao_resultado:
+                self.ao_resultado(resultado)
+
+    def _alvo(self, funcao):
+        return self.perfilador.envolver(funcao) if self.perfilador else funcao
+
+    def iniciar(self):
+        self._threads = [threading.Thread(target=self._alvo(self._capturar), daemon=True)]
+        self._threads += [threading.Thread(target=self._alvo(self._trabalhar), daemon=True)
+                          for _ in range(self.trabalhadores)]
+        for thread in self._threads:
+            thread.start()
+
+    def parar(self):
+        self._parar.set()
+        self.fila_frames.fechar()
+        self.fila_exibicao.fechar()
+        for thread in self._threads:
+            thread.join()
+        self.captura.release()
+
+    def _exibir(self, janela):
+        while True:
+            item = self.fila_exibicao.tirar(timeout=0.1)
+            if item is None:
+                if not self._threads[0].is_alive():
+                    break
+                continue
+            # O mesmo frame pode estar com um trabalhador: desenha numa cópia
+            # para as caixas e a sobreposição não entrarem na detecção
+            frame = item[2].copy()
+            with self.tempos.medir("desenho"):
+                desenhar_resultados(frame, self.ultimo_resultado.rostos)
+                if self.sobreposicao:
+                    desenhar_metricas(frame, self.tempos)
+            with self.tempos.medir("exibicao"):
+                cv2.imshow(janela, frame)
+                tecla = cv2.waitKey(1) & 0xFF
+            self.tempos.marcar("frames_exibidos")
+            if tecla == ord('q'):
+                break
+
+    def executar(self, janela=None):
+        """Roda até a fonte acabar (ou 'q' na janela). Sem `janela`, roda sem interface."""
+        inicio = time.perf_counter()
+        self.iniciar()
+        try:
+            if janela is None:
+                for thread in self._threads:
+                    thread.join()
+            else:
+                self._alvo(self._exibir)(janela)
+        finally:
+            self.parar()
+            if janela is not None:
+                cv2.destroyAllWindows()
+        self.duracao = time.perf_counter() - inicio
+
+    def relatorio(self):
+        linhas = [f"Frames lidos: {self.frames_lidos}, processados: {self.frames_processados}, "
+                  f"descartados: {self.fila_frames.descartados}"]
+        if getattr(self, "duracao", 0):
+            linhas.append(f"FPS processado: {self.frames_processados / self.duracao:.1f}")
+        for etapa, (contagem, media_ms) in sorted(self.tempos.resumo().items()):
+            p = self.tempos.percentis(etapa)
+            linhas.append(f"  {etapa:<12} {contagem:>7} chamadas {media_ms:>9.2f} ms  "
+                          f"p50 {p[50]:.2f}  p95 {p[95]:.2f}  p99 {p[99]:.2f}")
+        return "\n".join(linhas)
+
+
+if __name__ == '__main__':
+    from banco import inicializar_banco, atualizar_encodings, carregar_galeria, EscritorReconhecimentos
+    from indice import abrir_indice
+    from metricas import ExportadorMetricas, Perfilador
+
+    parser = argparse.ArgumentParser(description="Reconhecimento em pipeline (câmera, vídeo ou pasta de imagens).")
+    parser.add_argument("--fonte", default="0", help="índice da câmera, arquivo de vídeo, URL ou pasta de imagens")
+    parser.add_argument("--trabalhadores", type=int, default=None,
+                        help="threads de reconhecimento (padrão 2; com --escala/--intervalo, sempre 1)")
+    parser.add_argument("--sem-interface", action="store_true", help="não abre janela")
+    parser.add_argument("--sem-descarte", action="store_true",
+                        help="processa todos os frames da fonte em vez de só o mais recente")
+    parser.add_argument("--fps", type=float, default=None,
+                        help="ritmo de leitura de arquivos (padrão: o FPS do próprio vídeo)")
+    parser.add_argument("--escala", type=float, default=1.0, help="escala do frame usado na detecção")
+    parser.add_argument("--intervalo", type=int, default=1,
+                        help="frames entre detecções completas; os intermediários são rastreados")
+    parser.add_argument("--rastreador", default="kcf", choices=["kcf", "csrt", "fluxo"])
+    parser.add_argument("--sem-qualidade", action="store_true",
+                        help="codifica todos os rostos, sem descartar os pequenos, borrados ou de perfil")
+    parser.add_argument("--sem-registro", action="store_true",
+                        help="não grava os reconhecimentos na tabela reconhecimentos")
+    parser.add_argument("--sem-metricas", action="store_true", help="desliga os contadores por etapa")
+    parser.add_argument("--sobreposicao", action="store_true", help="mostra as métricas sobre o vídeo")
+    parser.add_argument("--metricas-arquivo", default=None,
+                        help="grava as métricas periodicamente (JSON, ou Prometheus se terminar em .prom)")
+    parser.add_argument("--metricas-porta", type=int, default=None,
+                        help="serve /metrics e /metrics.json nesta porta local")
+    parser.add_argument("--profile", default=None, metavar="RELATORIO",
+                        help="roda a sessão sob cProfile e grava o relatório (e RELATORIO.prof)")
+    args = parser.parse_args()
+
+    tempos = TemposEtapas(ativo=not args.sem_metricas)
+    inicializar_banco()
+    atualizar_encodings()
+    inicio_carga = time.perf_counter()
+    ids, nomes, matriz = carregar_galeria()
+    indice, nomes_por_id = abrir_indice(ids, matriz), dict(zip(ids, nomes))
+    tempos.definir("galeria_tamanho", len(ids))
+    tempos.definir("galeria_carga_segundos", time.perf_counter() - inicio_carga)
+    avaliador = None
+    if not args.sem_qualidade:
+        from qualidade import AvaliadorQualidade
+
+        avaliador = AvaliadorQualidade()
+    estrategia = None
+    if args.escala != 1 or args.intervalo > 1:
+        from deteccao import EstrategiaDeteccao
+
+        # O estado das trilhas é sequencial: um segundo trabalhador não acelera
+        # e entregaria frames fora de ordem ao rastreador
+        if args.trabalhadores not in (None, 1):
+            parser.error("--escala/--intervalo usam rastreamento e exigem --trabalhadores 1")
+        args.trabalhadores = 1
+
+        estrategia = EstrategiaDeteccao(indice, nomes_por_id, escala=args.escala, intervalo=args.intervalo,
+                                        rastreador=args.rastreador, qualidade=avaliador)
+        processar = estrategia.processar
+    else:
+        processar = criar_processador(indice, nomes_por_id, avaliador)
+
+    captura, ao_vivo = abrir_fonte(args.fonte)
+    if not captura.isOpened():
+        raise SystemExit(f"Não foi possível abrir a fonte {args.fonte}.")
+    # Arquivos são lidos no ritmo do vídeo para simular uma câmera
+    ritmo = None if ao_vivo or args.sem_descarte else (args.fps or captura.get(cv2.CAP_PROP_FPS) or 30.0)
+
+    escritor = None if args.sem_registro else EscritorReconhecimentos()
+    exportador = None
+    if args.metricas_arquivo or args.metricas_porta:
+        exportador = ExportadorMetricas(tempos, args.metricas_arquivo, args.metricas_porta)
+    perfilador = Perfilador() if args.profile else None
+    pipeline = PipelineReconhecimento(captura, processar, args.trabalhadores or 2,
+                                      descartar=not args.sem_descarte, ritmo=ritmo,
+                                      ao_resultado=registrador(escritor, str(args.fonte)) if escritor else None,
+                                      tempos=tempos, sobreposicao=args.sobreposicao, perfilador=perfilador)
+    pipeline.executar(janela=None if args.sem_interface else "Reconhecimento Facial")
+    if escritor:
+        escritor.fechar()
+    if exportador:
+        exportador.fechar()
+    if perfilador:
+        perfilador.salvar(args.profile)
+        print(f"Relatório do cProfile em {args.profile}")
+    print(pipeline.relatorio())
+    if estrategia is not None:
+        print(estrategia.relatorio())
+    if avaliador is not None:
+        evitados = sum(avaliador.rejeitados.values())
+        print(f"{avaliador.relatorio()}; encodings evitados: "
+              f"{evitados / max(pipeline.frames_processados, 1):.2f}/frame")
@@ -0,0 +1,117 @@
+from collections import Counter, namedtuple
+import numpy as np
+import cv2
+
+# Abaixo disso o chip de 150 px do encoder é quase todo interpolação
+LADO_MINIMO = 40
+# Variância do Laplaciano no recorte reduzido a LADO_NORMALIZADO px
+NITIDEZ_MINIMA = 20.0
+LADO_NORMALIZADO = 96
+# 0 = nariz no meio dos olhos (frontal), 1 = nariz na altura de um dos olhos (perfil)
+DESVIO_POSE_MAXIMO = 0.4
+ROLAGEM_MAXIMA = 25.0
+BRILHO_MINIMO, BRILHO_MAXIMO = 35.0, 215.0
+ROTULO_BAIXA_QUALIDADE = "?"
+
+Qualidade = namedtuple("Qualidade", "lado nitidez brilho desvio_pose rolagem nota motivo")
+
+
+def _pose(pontos):
+    """(desvio, rolagem) a partir dos 5 pontos do modelo small: olhos e ponta do nariz."""
+    olho_esquerdo = np.mean(pontos["left_eye"], axis=0)
+    olho_direito = np.mean(pontos["right_eye"], axis=0)
+    nariz = np.asarray(pontos["nose_tip"][0], dtype=np.float64)
+    eixo = olho_direito - olho_esquerdo
+    comprimento = float(np.dot(eixo, eixo))
+    if comprimento == 0:
+        return 1.0, 0.0
+    # Posição do nariz projetada na linha dos olhos: 0.5 quando o rosto está de frente
+    t = float(np.dot(nariz - olho_esquerdo, eixo)) / comprimento
+    rolagem = float(np.degrees(np.arctan2(eixo[1], eixo[0])))
+    # Olho esquerdo da pessoa fica à direita na imagem: a linha pode apontar para trás
+    if rolagem > 90:
+        rolagem -= 180
+    elif rolagem < -90:
+        rolagem += 180
+    return min(abs(t - 0.5) * 2, 1.0), rolagem
+
+
+class AvaliadorQualidade:
+    """Nota de qualidade de cada rosto detectado, calculada antes do encoding.
+
+    Os critérios vão do mais barato ao mais caro e param no primeiro que
+    reprova: tamanho da caixa, exposição e nitidez (variância do Laplaciano)
+    num recorte reduzido, e pose pelos 5 pontos do `face_landmarks` small,
+    calculados numa única chamada para todos os rostos que chegaram até lá.
+    Um rosto reprovado não vale o `face_encodings`: nunca casaria direito e
+    é a principal fonte de falsos reconhecimentos.
+    """
+
+    def __init__(self, lado_minimo=LADO_MINIMO, nitidez_minima=NITIDEZ_MINIMA, desvio_pose_maximo=DESVIO_POSE_MAXIMO,
+                 rolagem_maxima=ROLAGEM_MAXIMA, brilho=(BRILHO_MINIMO, BRILHO_MAXIMO), pose=True):
+        self.lado_minimo = lado_minimo
+        self.nitidez_minima = nitidez_minima
+        self.desvio_pose_maximo = desvio_pose_maximo
+        self.rolagem_maxima = rolagem_maxima
+        self.brilho_minimo, self.brilho_maximo = brilho
+        self.pose = pose
+        self._fr = None
+        self.avaliados = 0
+        self.rejeitados = Counter()
+
+    def _nota(self, lado, nitidez, brilho, desvio):
+        # Só serve para ordenar rostos aprovados, ex.: as melhores amostras do cadastro
+        return (min(lado / (3 * self.lado_minimo), 1.0) * min(nitidez / (4 * self.nitidez_minima), 1.0)
+                * (1 - abs(brilho - 128) / 128) * (1 - desvio))
+
+    def avaliar(self, rgb_frame, locais):
+        """Uma Qualidade por local; `motivo` é None para os aprovados."""
+        medidas = []
+        for top, right, bottom, left in locais:
+            lado = min(bottom - top, right - left)
+            if lado < self.lado_minimo:
+                medidas.append((lado, None, None, "pequeno"))
+                continue
+            recorte = rgb_frame[max(top, 0):bottom, max(left, 0):right]
+            cinza = cv2.resize(cv2.cvtColor(recorte, cv2.COLOR_RGB2GRAY), (LADO_NORMALIZADO, LADO_NORMALIZADO),
+                               interpolation=cv2.INTER_AREA)
+            brilho = float(cinza.mean())
+            nitidez = float(cv2.Laplacian(cinza, cv2.CV_64F).var())
+            if not self.brilho_minimo <= brilho <= self.brilho_maximo:
+                motivo = "exposicao"
+            elif nitidez < self.nitidez_minima:
+                motivo = "borrado"
+            else:
+                motivo = None
+            medidas.append((lado, nitidez, brilho, motivo))
+
+        candidatos = [i for i, medida in enumerate(medidas) if medida[3] is None]
+        poses = {}
+        if self.pose and candidatos:
+            if self._fr is None:
+                import face_recognition
+
+                self._fr = face_recognition
+            pontos = self._fr.face_landmarks(rgb_frame, [locais[i] for i in candidatos], model="small")
+            poses = {i: _pose(p) for i, p in zip(candidatos, pontos)}
+
+        qualidades = []
+        for i, (lado, nitidez, brilho, motivo) in enumerate(medidas):
+            desvio, rolagem = poses.get(i, (0.0, 0.0))
+            if motivo is None and (desvio > self.desvio_pose_maximo or abs(rolagem) > self.rolagem_maxima):
+                motivo = "pose"
+            nota = 0.0 if motivo else self._nota(lado, nitidez, brilho, desvio)
+            qualidades.append(Qualidade(lado, nitidez, brilho, desvio, rolagem, nota, motivo))
+        self.avaliados += len(qualidades)
+        self.rejeitados.update(q.motivo for q in qualidades if q.motivo)
+        return qualidades
+
+    def filtrar(self, rgb_frame, locais):
+        """(índices dos locais aprovados, qualidades de todos)."""
+        qualidades = self.avaliar(rgb_frame, locais)
+        return [i for i, q in enumerate(qualidades) if q.motivo is None], qualidades
+
+    def relatorio(self):
+        total = sum(self.rejeitados.values())
+        motivos = ", ".join(f"{motivo}: {n}" for motivo, n in self.rejeitados.most_common())
+        return f"Rostos avaliados: {self.avaliados}, reprovados: {total}" + (f" ({motivos})" if motivos else "")
@@ -1,55 +1,31 @@
 import os
 import cv2
-import face_recognition
 import tkinter as tk
 from tkinter import simpledialog, messagebox
+import time
+import argparse
 import threading
-import sqlite3
-from datetime import datetime
-import numpy as np
+from banco import inicializar_banco, atualizar_encodings, carregar_galeria, EscritorReconhecimentos
+from indice import abrir_indice, adicionar_ao_indice
+from pipeline import PipelineReconhecimento, registrador
+from deteccao import EstrategiaDeteccao
+from metricas import TemposEtapas, ExportadorMetricas, Perfilador
+from qualidade import AvaliadorQualidade
+from cadastro import AMOSTRAS_CADASTRO, coletar_amostras, salvar_amostras
 
 # Constantes
 PASTA_ROSTOS = "rostos_cadastrados"
-DB_PATH = "rostos.db"
+
+# Gravação em segundo plano dos reconhecimentos, criada ao abrir a interface
+escritor = None
+# Opções de linha de comando (métricas e perfil); os padrões valem quando importado
+opcoes = argparse.Namespace(metricas=True, sobreposicao=False, metricas_arquivo=None, profile=None,
+                            qualidade=True, amostras=AMOSTRAS_CADASTRO, centroide=False)
 
 # Garantir pastas e banco
 if not os.path.exists(PASTA_ROSTOS):
     os.makedirs(PASTA_ROSTOS)
 
-def inicializar_banco():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS usuarios (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome TEXT NOT NULL,
-            imagem_path TEXT NOT NULL,
-            data_cadastro TEXT NOT NULL
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-def salvar_usuario_no_banco(nome, caminho_imagem):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    data_cadastro = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    cursor.execute('''
-        INSERT INTO usuarios (nome, imagem_path, data_cadastro)
-        VALUES (?, ?, ?)
-    ''', (nome, caminho_imagem, data_cadastro))
-    conn.commit()
-    conn.close()
-
-def carregar_usuarios_do_banco():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute('SELECT nome, imagem_path FROM usuarios')
-    dados = cursor.fetchall()
-    conn.close()
-    return dados
-
-
 def capturar_rosto():
     nome = simpledialog.askstring("Cadastro", "Digite o nome da pessoa:")
     if not nome:
@@ -61,7 +37,8 @@ def capturar_rosto():
             messagebox.showerror("Erro", "Não foi possível acessar a câmera.")
             return
 
-        messagebox.showinfo("Instrução", "Posicione o rosto na câmera. Pressione 'c' para capturar.")
+        messagebox.showinfo("Instrução", "Posicione o rosto na câmera. Pressione 'c' e mexa levemente a "
+                                         "cabeça por alguns segundos.")
 
         while True:
             ret, frame = video_capture.read()
@@ -71,20 +48,19 @@ def capturar_rosto():
 
             cv2.imshow('Cadastro de Rosto', frame)
             if cv2.waitKey(1) & 0xFF == ord('c'):
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                face_locations = face_recognition.face_locations(rgb_frame)
-
-                if len(face_locations) == 1:
-                    top, right, bottom, left = face_locations[0]
-                    rosto = frame[top:bottom, left:right]
-                    caminho = os.path.join(PASTA_ROSTOS, f"{nome}.jpg")
-                    cv2.imwrite(caminho, rosto)
-                    salvar_usuario_no_banco(nome, caminho)
-                    messagebox.showinfo("Sucesso", f"Rosto de {nome} cadastrado com sucesso!")
-                elif len(face_locations) > 1:
-                    messagebox.showwarning("Aviso", "Mais de um rosto detectado. Tente novamente.")
+                # As melhores amostras de uma janela curta, não o frame do clique
+                avaliador = AvaliadorQualidade()
+                amostras = coletar_amostras(video_capture, avaliador, k=opcoes.amostras,
+                                            janela='Cadastro de Rosto')
+                if amostras:
+                    # Encodings calculados uma vez no cadastro e salvos no banco
+                    for id_usuario, encoding in salvar_amostras(nome, amostras, PASTA_ROSTOS, opcoes.centroide):
+                        adicionar_ao_indice(id_usuario, encoding)
+                    messagebox.showinfo("Sucesso", f"Rosto de {nome} cadastrado com sucesso "
+                                                   f"({len(amostras)} amostras)!")
                 else:
-                    messagebox.showwarning("Aviso", "Nenhum rosto detectado. Tente novamente.")
+                    messagebox.showwarning("Aviso", "Nenhuma imagem boa o suficiente. "
+                                                    f"{avaliador.relatorio()}. Tente novamente.")
                 break
 
         video_capture.release()
@@ -95,22 +71,23 @@ def capturar_rosto():
 
 def reconhecer_rosto():
     def processo_reconhecimento():
-        rostos_conhecidos = []
-        nomes_conhecidos = []
-
-        dados_usuarios = carregar_usuarios_do_banco()
-        for nome, caminho in dados_usuarios:
-            if os.path.exists(caminho):
-                imagem = face_recognition.load_image_file(caminho)
-                encodings = face_recognition.face_encodings(imagem)
-                if encodings:
-                    rostos_conhecidos.append(encodings[0])
-                    nomes_conhecidos.append(nome)
-
-        if not rostos_conhecidos:
+        tempos = TemposEtapas(ativo=opcoes.metricas)
+
+        # Só recalcula encodings ausentes ou de imagens alteradas
+        atualizar_encodings()
+        inicio_carga = time.perf_counter()
+        ids, nomes, matriz = carregar_galeria()
+
+        if not ids:
             messagebox.showinfo("Aviso", "Nenhum rosto cadastrado foi encontrado.")
             return
 
+        # Varredura exata para galerias pequenas, IVF salvo em disco para as grandes
+        indice = abrir_indice(ids, matriz)
+        nomes_por_id = dict(zip(ids, nomes))
+        tempos.definir("galeria_tamanho", len(ids))
+        tempos.definir("galeria_carga_segundos", time.perf_counter() - inicio_carga)
+
         video_capture = cv2.VideoCapture(0)
         if not video_capture.isOpened():
             messagebox.showerror("Erro", "Não foi possível acessar a câmera.")
@@ -118,42 +95,35 @@ def reconhecer_rosto():
 
         messagebox.showinfo("Instrução", "Posicione o rosto na câmera para reconhecimento. Pressione 'q' para sair.")
 
-        while True:
-            ret, frame = video_capture.read()
-            if not ret:
-                break
-
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            face_locations = face_recognition.face_locations(rgb_frame)
-            face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-
-            for (top, right, bottom, left), encoding in zip(face_locations, face_encodings):
-                matches = face_recognition.compare_faces(rostos_conhecidos, encoding)
-                nome = "Desconhecido"
-
-                face_distances = face_recognition.face_distance(rostos_conhecidos, encoding)
-                if len(face_distances) > 0:
-                    best_match_index = np.argmin(face_distances)
-                    if matches[best_match_index]:
-                        nome = nomes_conhecidos[best_match_index]
-
-                cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-                cv2.rectangle(frame, (left, bottom - 35), (right, bottom), (0, 255, 0), cv2.FILLED)
-                cv2.putText(frame, nome, (left + 6, bottom - 6),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
-
-            cv2.imshow('Reconhecimento Facial', frame)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
-
-        video_capture.release()
-        cv2.destroyAllWindows()
+        # Detecção reduzida a cada poucos frames e rastreamento entre elas;
+        # o encoding roda uma vez por rosto rastreado, não por frame
+        estrategia = EstrategiaDeteccao(indice, nomes_por_id,
+                                        qualidade=AvaliadorQualidade() if opcoes.qualidade else None)
+
+        # Captura, detecção e exibição em threads separadas: a janela não
+        # espera o dlib e o buffer da câmera não acumula atraso
+        exportador = ExportadorMetricas(tempos, opcoes.metricas_arquivo) if opcoes.metricas_arquivo else None
+        perfilador = Perfilador() if opcoes.profile else None
+        pipeline = PipelineReconhecimento(video_capture, estrategia.processar, trabalhadores=1,
+                                          ao_resultado=registrador(escritor, "camera 0"), tempos=tempos,
+                                          sobreposicao=opcoes.sobreposicao, perfilador=perfilador)
+        pipeline.executar(janela='Reconhecimento Facial')
+
+        if exportador:
+            exportador.fechar()
+        if perfilador:
+            perfilador.salvar(opcoes.profile)
+        if opcoes.metricas:
+            print(pipeline.relatorio())
+            print(estrategia.relatorio())
 
     threading.Thread(target=processo_reconhecimento).start()
 
 
 def iniciar_interface():
+    global escritor
     inicializar_banco()
+    escritor = EscritorReconhecimentos()
     root = tk.Tk()
     root.title("Sistema de Reconhecimento Facial")
     root.geometry("300x200")
@@ -163,7 +133,23 @@ def iniciar_interface():
     tk.Button(root, text="Sair", command=root.quit, width=25).pack(pady=10)
 
     root.mainloop()
+    escritor.fechar()
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Sistema de Reconhecimento Facial")
+    parser.add_argument("--sem-metricas", dest="metricas", action="store_false",
+                        help="desliga os contadores por etapa")
+    parser.add_argument("--sobreposicao", action="store_true", help="mostra as métricas sobre o vídeo")
+    parser.add_argument("--metricas-arquivo", default=None,
+                        help="grava as métricas periodicamente (JSON, ou Prometheus se terminar em .prom)")
+    parser.add_argument("--profile", default=None, metavar="RELATORIO",
+                        help="roda cada sessão de reconhecimento sob cProfile e grava o relatório")
+    parser.add_argument("--sem-qualidade", dest="qualidade", action="store_false",
+                        help="codifica todos os rostos, sem descartar os pequenos, borrados ou de perfil")
+    parser.add_argument("--amostras", type=int, default=AMOSTRAS_CADASTRO,
+                        help="melhores frames guardados por cadastro")
+    parser.add_argument("--centroide", action="store_true",
+                        help="grava a média das amostras em vez de um encoding por amostra")
+    opcoes = parser.parse_args()
     iniciar_interface()
\ No newline at end of file
@@ -5,10 +5,15 @@ import tkinter as tk
 from tkinter import simpledialog, messagebox
 import threading
 import numpy as np
+from banco import inicializar_banco, atualizar_encodings, carregar_usuarios_do_banco, salvar_usuario_no_banco
+from cadastro import caminho_livre
+from galeria import Galeria
+from metricas import TemposEtapas
 
 
 if not os.path.exists("rostos_cadastrados"):
     os.makedirs("rostos_cadastrados")
+inicializar_banco()
 
 
 def capturar_rosto():
@@ -46,8 +51,10 @@ def capturar_rosto():
                 if rosto_localizado:
                     top, right, bottom, left = rosto_localizado[0]
                     rosto = frame[top:bottom, left:right]
-                    caminho = os.path.join("rostos_cadastrados", f"{nome}.jpg")
+                    caminho = caminho_livre("rostos_cadastrados", nome)
                     cv2.imwrite(caminho, rosto)
+                    # O encoding é calculado uma vez, pelo atualizar_encodings ao reconhecer
+                    salvar_usuario_no_banco(nome, caminho)
                     messagebox.showinfo("Sucesso", f"Rosto de {nome} cadastrado com sucesso!")
                 else:
                     messagebox.showwarning("Aviso", "Nenhum rosto detectado. Tente novamente.")
@@ -61,17 +68,21 @@ def capturar_rosto():
         threading.Thread(target=processo_captura).start()
 
 
+def registrar_imagens_soltas():
+    """Cadastra no banco as imagens da pasta que ainda não estão lá (ex.: de versões antigas)."""
+    cadastrados = {os.path.normpath(caminho) for _, caminho in carregar_usuarios_do_banco()}
+    for arquivo in sorted(os.listdir("rostos_cadastrados")):
+        caminho = os.path.join("rostos_cadastrados", arquivo)
+        if os.path.isfile(caminho) and os.path.normpath(caminho) not in cadastrados:
+            salvar_usuario_no_banco(os.path.splitext(arquivo)[0], caminho)
+
+
 def reconhecer_rosto():
     def processo_reconhecimento():
-        rostos_conhecidos = []
-        nomes_conhecidos = []
-
-        for arquivo in os.listdir("rostos_cadastrados"):
-            imagem = face_recognition.load_image_file(os.path.join("rostos_cadastrados", arquivo))
-            encodings = face_recognition.face_encodings(imagem)
-            if encodings:
-                rostos_conhecidos.append(encodings[0])
-                nomes_conhecidos.append(os.path.splitext(arquivo)[0])
+        # Só as imagens novas ou alteradas passam pelo dlib; o resto vem pronto do banco
+        registrar_imagens_soltas()
+        atualizar_encodings()
+        galeria = Galeria.do_banco()
 
         video_capture = cv2.VideoCapture(0, cv2.CAP_DSHOW)
         if not video_capture.isOpened():
@@ -80,13 +91,16 @@ def reconhecer_rosto():
 
         messagebox.showinfo("Instrução", "Posicione o rosto na câmera para reconhecimento. Pressione 'q' para sair.")
 
+        tempos = TemposEtapas()
         while True:
-            ret, frame = video_capture.read()
+            with tempos.medir("captura"):
+                ret, frame = video_capture.read()
             if not ret or frame is None:
                 messagebox.showerror("Erro", "Falha ao capturar frame da câmera.")
                 break
 
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            with tempos.medir("conversao"):
+                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
 
             if rgb_frame is None or rgb_frame.size == 0:
                 messagebox.showerror("Erro", "Imagem inválida.")
@@ -95,28 +109,33 @@ def reconhecer_rosto():
             if rgb_frame.dtype != np.uint8:
                 rgb_frame = rgb_frame.astype(np.uint8)
 
-            rosto_localizado = face_recognition.face_locations(rgb_frame)
-            rosto_encodings = face_recognition.face_encodings(rgb_frame, rosto_localizado)
-
-            for (top, right, bottom, left), face_encoding in zip(rosto_localizado, rosto_encodings):
-                matches = face_recognition.compare_faces(rostos_conhecidos, face_encoding)
-                nome = "Desconhecido"
+            with tempos.medir("deteccao"):
+                rosto_localizado = face_recognition.face_locations(rgb_frame)
+            with tempos.medir("encoding"):
+                rosto_encodings = face_recognition.face_encodings(rgb_frame, rosto_localizado)
 
-                if True in matches:
-                    first_match_index = matches.index(True)
-                    nome = nomes_conhecidos[first_match_index]
+            # Usa o rosto mais próximo dentro da tolerância, não o primeiro que casar
+            with tempos.medir("casamento"):
+                identidades = galeria.identificar(rosto_encodings)
+            tempos.observar("rostos_por_frame", len(rosto_localizado))
+            tempos.marcar("frames_processados")
 
+            for (top, right, bottom, left), (nome, _) in zip(rosto_localizado, identidades):
                 cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
                 cv2.rectangle(frame, (left, bottom - 35), (right, bottom), (0, 255, 0), cv2.FILLED)
                 font = cv2.FONT_HERSHEY_DUPLEX
                 cv2.putText(frame, nome, (left + 6, bottom - 6), font, 1.0, (255, 255, 255), 1)
 
-            cv2.imshow('Video', frame)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+            with tempos.medir("exibicao"):
+                cv2.imshow('Video', frame)
+                tecla = cv2.waitKey(1) & 0xFF
+            if tecla == ord('q'):
                 break
 
         video_capture.release()
         cv2.destroyAllWindows()
+        for etapa, (contagem, media_ms) in sorted(tempos.resumo().items()):
+            print(f"{etapa:<10} {contagem:>6} chamadas {media_ms:>9.2f} ms  p95 {tempos.percentis(etapa)[95]:.2f} ms")
 
     threading.Thread(target=processo_reconhecimento).start()
 
@@ -0,0 +1,302 @@
+import json
+import time
+import signal
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from multiprocessing import shared_memory
+import numpy as np
+import cv2
+from banco import (DIMENSAO_ENCODING, inicializar_banco, atualizar_encodings, carregar_galeria,
+                   EscritorReconhecimentos)
+from galeria import TOLERANCIA_PADRAO
+from indice import LIMITE_EXATO, CAMINHO_INDICE, IndiceExato, IndiceIVF, abrir_indice, identificar
+from pipeline import abrir_fonte
+
+# Estado de cada processo trabalhador, montado uma vez pelo inicializador
+_estado = {}
+
+
+def _inicializar_trabalhador(nome_memoria, ids, nomes, escala, tolerancia, qualidade):
+    import face_recognition
+    from qualidade import AvaliadorQualidade
+
+    if len(ids) < LIMITE_EXATO:
+        # A galeria fica na memória compartilhada criada pelo serviço: nenhum processo copia
+        memoria = shared_memory.SharedMemory(name=nome_memoria)
+        matriz = np.ndarray((len(ids), DIMENSAO_ENCODING), dtype=np.float32, buffer=memoria.buf)
+        indice = IndiceExato(matriz, ids, copiar=False)
+        _estado["memoria"] = memoria
+    else:
+        # O índice IVF já é aberto por mmap: as páginas são compartilhadas pelo sistema
+        indice = IndiceIVF.carregar(CAMINHO_INDICE)
+    _estado.update(fr=face_recognition, indice=indice, nomes_por_id=dict(zip(ids, nomes)),
+                   escala=escala, tolerancia=tolerancia,
+                   qualidade=AvaliadorQualidade() if qualidade else None)
+
+
+def processar_frame(frame):
+    """Roda no pool: detecção, encoding e busca para um frame BGR."""
+    fr, escala = _estado["fr"], _estado["escala"]
+    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    pequeno = rgb_frame if escala == 1 else cv2.resize(rgb_frame, (0, 0), fx=escala, fy=escala)
+    locais = [tuple(int(round(v / escala)) for v in local) for local in fr.face_locations(pequeno)]
+    if not locais:
+        return []
+    # Rostos reprovados na qualidade saem sem nome e com o motivo, sem passar pelo encoder
+    motivos = [None] * len(locais)
+    aprovados = list(range(len(locais)))
+    if _estado["qualidade"] is not None:
+        aprovados, qualidades = _estado["qualidade"].filtrar(rgb_frame, locais)
+        motivos = [q.motivo for q in qualidades]
+    encodings = fr.face_encodings(rgb_frame, [locais[i] for i in aprovados])
+    identidades = dict(zip(aprovados, identificar(_estado["indice"], encodings, _estado["nomes_por_id"],
+                                                  _estado["tolerancia"])))
+    rostos = []
+    for i, local in enumerate(locais):
+        nome, distancia, id_usuario = identidades.get(i, (None, None, None))
+        # Distância infinita (galeria vazia) não é JSON válido
+        if distancia is not None and not np.isfinite(distancia):
+            distancia = None
+        rostos.append({"caixa": list(local), "nome": nome, "distancia": distancia, "id": id_usuario,
+                       "qualidade": motivos[i] or "ok"})
+    return rostos
+
+
+class Fluxo:
+    """Uma fonte de vídeo: a thread de captura guarda só o frame mais recente."""
+
+    def __init__(self, numero, fonte, repetir=False):
+        self.numero = numero
+        self.fonte = str(fonte)
+        self.repetir = repetir
+        self.captura, self.ao_vivo = abrir_fonte(fonte)
+        if not self.captura.isOpened():
+            raise SystemExit(f"Não foi possível abrir a fonte {fonte}.")
+        self.ativo = True
+        self.em_voo = False
+        self.proximo_envio = 0.0
+        self.ultimo_resultado = None
+        self.lidos = self.processados = self.descartados = 0
+        self._frame = None
+        self._lock = threading.Lock()
+
+    def capturar(self, parar, novos):
+        # Arquivos são lidos no ritmo do vídeo para simular uma câmera
+        fps = 0.0 if self.ao_vivo else (self.captura.get(cv2.CAP_PROP_FPS) or 30.0)
+        proximo = time.perf_counter()
+        while not parar.is_set():
+            ret, frame = self.captura.read()
+            if not ret or frame is None:
+                if self.repetir and not self.ao_vivo:
+                    self.captura.release()
+                    self.captura, _ = abrir_fonte(self.fonte)
+                    continue
+                break
+            with self._lock:
+                if self._frame is not None:
+                    self.descartados += 1
+                self._frame = (self.lidos, time.time(), frame)
+                self.lidos += 1
+            with novos:
+                novos.notify()
+            if fps:
+                proximo += 1.0 / fps
+                espera = proximo - time.perf_counter()
+                if espera > 0:
+                    time.sleep(espera)
+        self.captura.release()
+        self.ativo = False
+        with novos:
+            novos.notify()
+
+    def pegar_frame(self):
+        with self._lock:
+            item, self._frame = self._frame, None
+            return item
+
+
+class ServicoReconhecimento:
+    """Várias câmeras compartilhando uma galeria e um pool de processos.
+
+    O escalonador percorre os fluxos em rodízio e envia ao pool o frame mais
+    recente de cada um, respeitando o limite de `fps` por fluxo e no máximo
+    um frame em processamento por fluxo, para que uma câmera rápida não tome
+    o pool das outras.
+    """
+
+    def __init__(self, fontes, processos=4, fps=5.0, escala=1.0, tolerancia=TOLERANCIA_PADRAO,
+                 repetir=False, escritor=None, qualidade=True):
+        self.fluxos = [Fluxo(i, fonte, repetir) for i, fonte in enumerate(fontes)]
+        self.processos = processos
+        self.fps = fps
+        self.escala = escala
+        self.tolerancia = tolerancia
+        self.escritor = escritor
+        self.qualidade = qualidade
+        self.parar = threading.Event()
+        self._novos = threading.Condition()
+        self._em_voo = 0
+        self._vez = 0
+        self._memoria = None
+
+    def _carregar_galeria(self):
+        ids, nomes, matriz = carregar_galeria()
+        # Garante o índice IVF salvo em disco antes dos trabalhadores abrirem
+        abrir_indice(ids, matriz)
+        # Só a varredura exata lê a matriz; com o IVF os trabalhadores usam o mmap do índice
+        if len(ids) < LIMITE_EXATO:
+            tamanho = max(matriz.nbytes, 1)
+            self._memoria = shared_memory.SharedMemory(create=True, size=tamanho)
+            np.ndarray(matriz.shape, dtype=np.float32, buffer=self._memoria.buf)[:] = matriz
+        return ids, nomes
+
+    def _concluido(self, fluxo, numero, instante, futuro):
+        try:
+            rostos = futuro.result()
+        except Exception as erro:
+            print(f"Erro no fluxo {fluxo.fonte}: {erro}")
+            rostos = []
+        fluxo.ultimo_resultado = {"fluxo": fluxo.numero, "fonte": fluxo.fonte, "frame": numero,
+                                  "instante": instante, "rostos": rostos}
+        fluxo.processados += 1
+        if self.escritor:
+            for rosto in rostos:
+                if rosto["id"] is not None:
+                    self.escritor.registrar(rosto["id"], rosto["distancia"], fluxo.fonte, instante)
+        with self._novos:
+            fluxo.em_voo = False
+            self._em_voo -= 1
+            self._novos.notify()
+
+    def _escalonar(self, executor):
+        agora = time.monotonic()
+        enviados = 0
+        n = len(self.fluxos)
+        for passo in range(n):
+            if self._em_voo >= self.processos:
+                break
+            posicao = (self._vez + passo) % n
+            fluxo = self.fluxos[posicao]
+            if fluxo.em_voo or agora < fluxo.proximo_envio:
+                continue
+            item = fluxo.pegar_frame()
+            if item is None:
+                continue
+            numero, instante, frame = item
+            fluxo.em_voo = True
+            fluxo.proximo_envio = agora + (1.0 / self.fps if self.fps else 0.0)
+            self._em_voo += 1
+            self._vez = (posicao + 1) % n
+            futuro = executor.submit(processar_frame, frame)
+            futuro.add_done_callback(lambda f, fl=fluxo, nu=numero, ins=instante: self._concluido(fl, nu, ins, f))
+            enviados += 1
+        return enviados
+
+    def executar(self):
+        ids, nomes = self._carregar_galeria()
+        threads = [threading.Thread(target=fluxo.capturar, args=(self.parar, self._novos), daemon=True)
+                   for fluxo in self.fluxos]
+        try:
+            with ProcessPoolExecutor(self.processos, initializer=_inicializar_trabalhador,
+                                     initargs=(self._memoria.name if self._memoria else None, ids, nomes,
+                                               self.escala, self.tolerancia, self.qualidade)) as executor:
+                for thread in threads:
+                    thread.start()
+                while not self.parar.is_set():
+                    with self._novos:
+                        if not self._escalonar(executor):
+                            if not any(f.ativo for f in self.fluxos) and self._em_voo == 0:
+                                break
+                            self._novos.wait(timeout=0.01)
+        finally:
+            self.parar.set()
+            for thread in threads:
+                thread.join()
+            if self._memoria is not None:
+                self._memoria.close()
+                self._memoria.unlink()
+                self._memoria = None
+
+    def estado(self):
+        return {"fluxos": [{"fonte": f.fonte, "ativo": f.ativo, "lidos": f.lidos,
+                            "processados": f.processados, "descartados": f.descartados}
+                           for f in self.fluxos]}
+
+    def resultados(self):
+        return [f.ultimo_resultado for f in self.fluxos]
+
+
+class _Manipulador(BaseHTTPRequestHandler):
+    def do_GET(self):
+        servico = self.server.servico
+        if self.path in ("/", "/resultados"):
+            corpo = servico.resultados()
+        elif self.path.startswith("/resultados/") and self.path.rsplit("/", 1)[1].isdigit():
+            numero = int(self.path.rsplit("/", 1)[1])
+            if numero >= len(servico.fluxos):
+                self.send_error(404)
+                return
+            corpo = servico.fluxos[numero].ultimo_resultado
+        elif self.path == "/estado":
+            corpo = servico.estado()
+        else:
+            self.send_error(404)
+            return
+        dados = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+def publicar(servico, porta, endereco="127.0.0.1"):
+    """Endpoint HTTP local: /resultados, /resultados/<n> e /estado."""
+    servidor = ThreadingHTTPServer((endereco, porta), _Manipulador)
+    servidor.servico = servico
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serviço de reconhecimento para várias câmeras.")
+    parser.add_argument("fontes", nargs="+", help="índices de câmera, URLs RTSP, arquivos de vídeo ou pastas")
+    parser.add_argument("--processos", type=int, default=4)
+    parser.add_argument("--fps", type=float, default=5.0, help="frames por segundo processados por fluxo")
+    parser.add_argument("--escala", type=float, default=1.0, help="escala dos frames na detecção")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--repetir", action="store_true", help="reinicia arquivos de vídeo ao terminar")
+    parser.add_argument("--sem-registro", action="store_true",
+                        help="não grava os reconhecimentos na tabela reconhecimentos")
+    parser.add_argument("--sem-qualidade", action="store_true",
+                        help="codifica todos os rostos, sem descartar os pequenos, borrados ou de perfil")
+    args = parser.parse_args()
+
+    inicializar_banco()
+    atualizar_encodings()
+    escritor = None if args.sem_registro else EscritorReconhecimentos()
+    servico = ServicoReconhecimento(args.fontes, args.processos, args.fps, args.escala,
+                                    repetir=args.repetir, escritor=escritor, qualidade=not args.sem_qualidade)
+    servidor = publicar(servico, args.porta)
+    # SIGTERM encerra como o Ctrl+C, liberando a memória compartilhada
+    signal.signal(signal.SIGTERM, lambda *_: servico.parar.set())
+    print(f"Publicando em http://127.0.0.1:{args.porta}/resultados (Ctrl+C para sair)")
+    try:
+        servico.executar()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.shutdown()
+        if escritor:
+            escritor.fechar()
+    for fluxo in servico.estado()["fluxos"]:
+        print(f"{fluxo['fonte']}: {fluxo['lidos']} frames lidos, {fluxo['processados']} processados")
+
+
+if __name__ == '__main__':
+    main()
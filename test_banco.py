@@ -0,0 +1,57 @@
+import sqlite3
+import time
+import pytest
+import banco
+
+
+@pytest.fixture
+def banco_temporario(tmp_path, monkeypatch):
+    monkeypatch.setattr(banco, "DB_PATH", str(tmp_path / "teste.db"))
+    banco.inicializar_banco()
+    banco.fechar_conexao()
+    conexao = banco.conexao
+
+    def conexao_impaciente():
+        # Sem os 30 s de espera pelo lock: o erro aparece logo
+        conn = conexao()
+        conn.execute("PRAGMA busy_timeout = 50")
+        return conn
+
+    monkeypatch.setattr(banco, "conexao", conexao_impaciente)
+    return banco.DB_PATH
+
+
+def contar(caminho):
+    with sqlite3.connect(caminho) as conn:
+        return conn.execute("SELECT COUNT(*) FROM reconhecimentos").fetchone()[0]
+
+
+def test_escritor_sobrevive_ao_banco_bloqueado(banco_temporario):
+    bloqueio = sqlite3.connect(banco_temporario, isolation_level=None)
+    bloqueio.execute("BEGIN IMMEDIATE")
+    escritor = banco.EscritorReconhecimentos(max_eventos=10, intervalo_ms=20)
+    for i in range(25):
+        escritor.registrar(1, 0.4, "teste")
+    time.sleep(0.3)
+    assert escritor.falhas > 0
+    assert escritor._thread.is_alive()
+
+    bloqueio.execute("COMMIT")
+    bloqueio.close()
+    escritor.fechar()
+    assert escritor.descartados == 0
+    assert contar(banco_temporario) == 25
+
+
+def test_escritor_descarta_quando_a_fila_enche(banco_temporario):
+    bloqueio = sqlite3.connect(banco_temporario, isolation_level=None)
+    bloqueio.execute("BEGIN IMMEDIATE")
+    escritor = banco.EscritorReconhecimentos(max_eventos=5, intervalo_ms=20, max_fila=10)
+    for i in range(100):
+        escritor.registrar(1, 0.4, "teste")
+    assert escritor.descartados >= 100 - 10 - 5
+
+    bloqueio.execute("COMMIT")
+    bloqueio.close()
+    escritor.fechar()
+    assert contar(banco_temporario) + escritor.descartados == 100
@@ -0,0 +1,85 @@
+import numpy as np
+import cv2
+import pytest
+from qualidade import AvaliadorQualidade
+
+LOCAL = (20, 140, 140, 20)
+
+
+class PontosFixos:
+    """No lugar do face_recognition: devolve os 5 pontos pedidos e conta as chamadas."""
+
+    def __init__(self, olho_esquerdo=(50, 60), olho_direito=(110, 60), nariz=(80, 90)):
+        self.olhos = olho_esquerdo, olho_direito
+        self.nariz = nariz
+        self.chamadas = 0
+
+    def face_landmarks(self, imagem, locais, model="large"):
+        self.chamadas += 1
+        return [{"left_eye": [self.olhos[0]] * 2, "right_eye": [self.olhos[1]] * 2, "nose_tip": [self.nariz]}
+                for _ in locais]
+
+
+def avaliador(pontos=None):
+    avaliador = AvaliadorQualidade()
+    avaliador._fr = pontos or PontosFixos()
+    return avaliador
+
+
+@pytest.fixture
+def imagem():
+    # Textura nítida com brilho médio, no lugar de um rosto bem iluminado
+    rng = np.random.default_rng(0)
+    ruido = rng.integers(0, 256, (160, 160), dtype=np.uint8)
+    cinza = cv2.GaussianBlur(ruido, (0, 0), 1.0)
+    return cv2.cvtColor(cinza, cv2.COLOR_GRAY2RGB)
+
+
+def test_rosto_bom_aprovado(imagem):
+    qualidade = avaliador().avaliar(imagem, [LOCAL])[0]
+    assert qualidade.motivo is None
+    assert qualidade.nota > 0
+
+
+def test_rosto_pequeno_reprovado_sem_landmarks(imagem):
+    pontos = PontosFixos()
+    qualidade = avaliador(pontos).avaliar(imagem, [(20, 40, 40, 20)])[0]
+    assert qualidade.motivo == "pequeno"
+    assert qualidade.nota == 0
+    assert pontos.chamadas == 0
+
+
+def test_rosto_borrado_reprovado(imagem):
+    borrada = cv2.GaussianBlur(imagem, (0, 0), 5)
+    assert avaliador().avaliar(borrada, [LOCAL])[0].motivo == "borrado"
+
+
+@pytest.mark.parametrize("fator", [0.1, 3.0])
+def test_rosto_mal_exposto_reprovado(imagem, fator):
+    exposta = np.clip(imagem * fator, 0, 255).astype(np.uint8)
+    assert avaliador().avaliar(exposta, [LOCAL])[0].motivo == "exposicao"
+
+
+def test_rosto_de_perfil_reprovado(imagem):
+    # Nariz quase na altura do olho direito
+    pontos = PontosFixos(nariz=(105, 90))
+    assert avaliador(pontos).avaliar(imagem, [LOCAL])[0].motivo == "pose"
+
+
+def test_rosto_inclinado_reprovado(imagem):
+    # Linha dos olhos a ~45 graus, nariz no meio dela
+    pontos = PontosFixos(olho_esquerdo=(50, 50), olho_direito=(110, 110), nariz=(80, 80))
+    qualidade = avaliador(pontos).avaliar(imagem, [LOCAL])[0]
+    assert qualidade.motivo == "pose"
+    assert abs(qualidade.rolagem) == pytest.approx(45)
+
+
+def test_filtrar_conta_reprovados_e_agrupa_landmarks(imagem):
+    pontos = PontosFixos()
+    filtro = avaliador(pontos)
+    aprovados, qualidades = filtro.filtrar(imagem, [LOCAL, (0, 10, 10, 0), LOCAL])
+    assert aprovados == [0, 2]
+    assert [q.motivo for q in qualidades] == [None, "pequeno", None]
+    assert filtro.rejeitados == {"pequeno": 1}
+    # Uma chamada de landmarks para todos os rostos que passaram pelos critérios baratos
+    assert pontos.chamadas == 1